@@ -1,123 +1,599 @@
+import json
+import math
 import time
+from Profiling import SearchProfile
+from Transposition import TranspositionTable, SharedTranspositionTable, EXACT, LOWER, UPPER
 
 class SearchResult:
     """
     A record containing the result of the search.
     """
-    def __init__(self, value, move, elapsed_time, nodes, cutoff=False):
+    def __init__(self, value, move, elapsed_time, nodes, cutoff=False, depth=None, profile=None, pv=None,
+                 lines=None):
         self.value = value          # The minimax value of the chosen move
         self.move = move            # The move that was chosen
         self.elapsed_time = elapsed_time  # Total time spent searching
         self.nodes = nodes          # Total number of nodes expanded during search
         self.cutoff = cutoff        # True if the search ended due to cutoff
+        self.depth = depth          # Deepest depth limit that was searched completely
+        self.profile = profile      # SearchProfile, if the search was profiled
+        self.pv = pv or []          # Principal variation, starting with the chosen move
+        self.lines = lines or []    # (value, principal variation) of the best root moves, best first
+
+    def as_dict(self):
+        return {"value": self.value, "move": self.move, "elapsed_time": self.elapsed_time,
+                "nodes": self.nodes, "cutoff": self.cutoff, "depth": self.depth, "pv": self.pv,
+                "lines": [{"value": value, "pv": pv} for value, pv in self.lines],
+                "profile": self.profile.as_dict() if self.profile else None}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.as_dict(), **kwargs)
 
     def __str__(self):
         return (f"Chosen move: {self.move} with value {self.value} "
-                f"(Elapsed time: {self.elapsed_time:.4f} sec, Nodes expanded: {self.nodes})")
+                f"(Elapsed time: {self.elapsed_time:.4f} sec, Nodes expanded: {self.nodes}, "
+                f"Depth: {self.depth}{', cut off' if self.cutoff else ''})")
 
 def current_time():
     return time.perf_counter()
 
+class SearchTimeout(Exception):
+    """
+    Raised inside the search when its time or node budget runs out.
+    """
+    pass
+
 class MiniMax:
     """
     Implements the Minimax algorithm with Alpha-Beta pruning, transposition table, 
     and a depth cutoff.
+    The search is written in negamax form: every node is scored for the side
+    to move, and values are turned back to Max's point of view in the result.
+    It is a principal variation search: only the first move of a node gets the
+    full window, the rest are tested with a null window first.
+    The transposition table is kept between calls, so consecutive moves of a
+    game reuse each other's results; pass one in to control its size.
+    The search deepens iteratively up to the depth limit; given a time or
+    node budget it keeps deepening instead and returns the result of the last
+    depth it completed. Each iteration after the first starts with an
+    aspiration window around the previous score.
+    Moves are ordered before they are searched: the transposition table move,
+    then captures, then killer moves, then quiet moves by history score.
+    Given an endgame table (Tablebase.EndgameTable), Titan Hero vs Pantheon
+    positions are scored exactly from it instead of being searched, with
+    quicker wins and slower losses scoring higher.
+    Selective search, each part off by default:
+        reductions  late quiet Legion moves are searched one ply shallower
+                    first, and again at full depth only if they beat alpha
+        futility    just above the leaves, moves without combat are skipped
+                    when the static value is FUTILITY_MARGIN or more below alpha
+        extensions  positions where the Titan Hero is in the Pantheon's line
+                    of sight are searched one ply deeper, at most
+                    MAX_EXTENSIONS times along a line
+    Given a batch evaluator (BatchEval.BatchEvaluator), the leaves below a
+    node one ply above the depth limit are collected and scored together;
+    values and node counts are unchanged, but such leaves no longer pass
+    through _negamax, so a profile does not see them.
+    With multipv above 1 the search also ranks the next best root moves:
+    each further line is a root search with the moves of the lines before it
+    left out, so every line's value is exact and comes with its principal
+    variation. The lines share the transposition table, so they mostly
+    replay what the first line already searched.
+    Set profile to attach a SearchProfile with detailed counters and timings
+    to each SearchResult; an unprofiled search pays nothing for it.
     """
     INF = 2**20
+    MAX_DEPTH = 100         # deepest iteration tried when searching on a budget
+    CHECK_INTERVAL = 64     # nodes between clock checks
+
+    KILLERS_PER_PLY = 2
+    ASPIRATION_WINDOW = 25  # initial half-width of the aspiration window; None for full windows
 
-    def __init__(self, game):
+    LMR_MIN_DRAFT = 3       # plies left below a node before its moves are reduced
+    LMR_MIN_INDEX = 3       # moves searched at full depth before reductions start
+    FUTILITY_MARGIN = 60    # most a quiet move can gain in eval
+    MAX_EXTENSIONS = 1      # extensions allowed along one line
+
+    def __init__(self, game, transposition_table=None, ordering=True, profile=False, tablebase=None,
+                 reductions=False, futility=False, extensions=False, batch_eval=None, multipv=1):
         self.game = game
         self.nodes_expanded = 0
-        self.transposition_table = {}
+        if transposition_table is None:
+            transposition_table = TranspositionTable()
+        self.transposition_table = transposition_table
+        self.ordering = ordering
+        self.profile = profile
+        self.tablebase = tablebase
+        self.reductions = reductions
+        self.futility = futility
+        self.extensions = extensions
+        self.batch_eval = batch_eval
+        self.multipv = multipv  # root moves ranked with exact values
+        self._extended = 0      # extensions on the line being searched
+        self.killers = {}       # ply -> recent quiet moves that caused a cutoff
+        self.history = {}       # move -> accumulated cutoff score
+        self._deadline = None
+        self._node_limit = None
+        self._next_check = self.INF
+        self.stopped = False    # set by stop(); cleared by the caller before the next search
+        # Called after every completed iteration with (depth, value, nodes, elapsed, pv).
+        self.on_iteration = None
 
-    def choose_move_max(self, state):
-        start_time = current_time()
+    def stop(self):
+        """ Ask a search running in another thread to give up as soon as
+            possible. The search returns as if its budget had run out.
+        """
+        self.stopped = True
+        self._next_check = 0
+
+    def attach_shared_table(self, name):
+        """ Use the shared-memory transposition table created under the given
+            name, for example by another process searching the same game.
+        """
+        self.transposition_table = SharedTranspositionTable.attach(name)
+        return self.transposition_table
+
+    def choose_move_max(self, state, time_limit=None, node_limit=None, max_depth=None):
+        """ Search for Max's best move.
+            :param time_limit: seconds to search for, or None
+            :param node_limit: number of nodes to expand, or None
+            :param max_depth: deepest depth limit to iterate to; defaults to
+                              the game's depth limit when there is no budget
+        """
+        return self.choose_move(state, time_limit, node_limit, max_depth)
+
+    def choose_move_min(self, state, time_limit=None, node_limit=None, max_depth=None):
+        """ Search for Min's best move; parameters as for choose_move_max.
+        """
+        return self.choose_move(state, time_limit, node_limit, max_depth)
+
+    def _begin_search(self):
+        """ Reset the per-search counters and move-ordering tables.
+        """
         self.nodes_expanded = 0
-        self.transposition_table = {}
+        self.transposition_table.new_search()
+        self.killers = {}
+        self.history = {}
+        self._extended = 0
 
-        best_value = -self.INF
-        best_move = None
-        alpha = -self.INF
-        beta = self.INF
+    def choose_move(self, state, time_limit=None, node_limit=None, max_depth=None):
+        """ Search for the best move of the side to move; parameters as for
+            choose_move_max. The value in the result is from Max's point of view.
+        """
+        start_time = current_time()
+        self._begin_search()
+        # Search works by making and unmaking moves on a private copy. A search
+        # cut off by its budget leaves the copy with moves still applied, so
+        # the side to move and the fallback move come from the caller's state.
+        root, state = state, state.myclone()
+        profile = SearchProfile() if self.profile else None
+        if profile:
+            profile.install(self)
 
-        for action in self.game.actions(state):
-            value = self._min_value(self.game.result(state, action), alpha, beta, 1)
-            if value > best_value:
-                best_value = value
-                best_move = action
-            alpha = max(alpha, best_value)
+        if max_depth is None:
+            # Fixed depth: still deepen iteratively up to the game's depth limit.
+            # The shallow iterations are cheap, and they fill the transposition
+            # table and give the aspiration window its centre.
+            fixed = time_limit is None and node_limit is None
+            max_depth = self.game.depth_limit if fixed else self.MAX_DEPTH
+        # Depth limit 0 still searches the root moves one ply deep.
+        depths = range(min(1, max_depth), max_depth + 1)
+
+        best_value, best_move, pv, reached, cutoff = None, None, [], None, False
+        lines = []
+        try:
+            for depth in depths:
+                try:
+                    if self.multipv > 1:
+                        lines = self._multipv_search(state, depth, lines)
+                        best_value, pv = lines[0]
+                        best_move = pv[0]
+                    else:
+                        best_value, best_move, pv = self._aspiration_search(state, depth, best_value, best_move)
+                        lines = [(best_value, pv)]
+                    reached = depth
+                except SearchTimeout:
+                    cutoff = True
+                    break
+                if self.on_iteration is not None:
+                    self.on_iteration(depth, best_value if root.maxs_turn else -best_value,
+                                      self.nodes_expanded, current_time() - start_time, pv)
+                # The budget only applies once a first depth has been completed.
+                if time_limit is not None:
+                    self._deadline = start_time + time_limit
+                    if current_time() >= self._deadline:
+                        cutoff = depth != depths[-1]
+                        break
+                if node_limit is not None:
+                    self._node_limit = node_limit
+                    if self.nodes_expanded >= node_limit:
+                        cutoff = depth != depths[-1]
+                        break
+                self._next_check = self.nodes_expanded
+        finally:
+            self._deadline = None
+            self._node_limit = None
+            self._next_check = self.INF
+            if profile:
+                profile.remove()
 
         elapsed = current_time() - start_time
         if best_move is None:
-            legal_moves = self.game.actions(state)
+            legal_moves = self.game.actions(root)
             if legal_moves:
                 best_move = legal_moves[0]
+                pv = [best_move]
             else:
                 raise ValueError("No legal moves available.")
-        return SearchResult(best_value, best_move, elapsed, self.nodes_expanded)
+        if best_value is not None and not root.maxs_turn:
+            best_value = -best_value
+            lines = [(-value, line) for value, line in lines]
+        return SearchResult(best_value, best_move, elapsed, self.nodes_expanded, cutoff, reached, profile, pv,
+                            lines)
 
-    def choose_move_min(self, state):
-        start_time = current_time()
-        self.nodes_expanded = 0
-        self.transposition_table = {}
+    def _aspiration_search(self, state, depth, guess, first_move, exclude=()):
+        """ Root search to the given depth limit with a window around the
+            previous iteration's value, widened and searched again whenever
+            the value falls outside it.
+            :param exclude: root moves to leave out
+            :return: (value for the side to move, best move, principal variation)
+        """
+        window = self.ASPIRATION_WINDOW
+        if guess is None or window is None:
+            return self._root_search(state, depth, first_move, exclude=exclude)
+        alpha, beta = guess - window, guess + window
+        while True:
+            value, move, pv = self._root_search(state, depth, first_move, alpha, beta, exclude)
+            if value <= alpha and alpha > -self.INF:
+                window *= 4
+                alpha = max(value - window, -self.INF)
+            elif value >= beta and beta < self.INF:
+                window *= 4
+                beta = min(value + window, self.INF)
+            else:
+                return value, move, pv
+            first_move = move
+
+    def _multipv_search(self, state, depth, previous):
+        """ The best multipv root moves at the given depth limit, found one
+            at a time: each line searches the root moves the lines before it
+            did not take, with an aspiration window around the value of the
+            same line in the previous iteration.
+            :param previous: the previous iteration's lines
+            :return: [(value for the side to move, principal variation)], best first
+        """
+        count = min(self.multipv, len(self.game.actions(state)))
+        lines, taken = [], []
+        for k in range(count):
+            guess, first_move = (previous[k][0], previous[k][1][0]) if k < len(previous) else (None, None)
+            value, move, pv = self._aspiration_search(state, depth, guess, first_move, taken)
+            lines.append((value, pv))
+            taken.append(move)
+        return lines
+
+    def search_move(self, state, action, alpha, beta, depth, deadline=None, node_limit=None):
+        """ Search the position after a single root move to the given depth
+            limit, within the window (alpha, beta). This is the unit of work
+            handed to other processes by ParallelSearch; nodes_expanded
+            accumulates until the next _begin_search.
+            :param state: the root state, which is not modified
+            :param deadline: current_time() by which to give up, or None;
+                             absolute, so a task that waited in a queue does
+                             not get a fresh budget
+            :param node_limit: number of nodes this move may expand, or None
+            :return: the value of the move from Max's point of view, like
+                     alpha and beta; raises SearchTimeout if the time or
+                     node budget runs out first
+        """
+        offset = self.game.depth_limit - depth
+        self._extended = 0
+        self._deadline = deadline
+        if node_limit is not None:
+            self._node_limit = self.nodes_expanded + node_limit
+        if deadline is not None or node_limit is not None:
+            self._next_check = self.nodes_expanded
+        # The child is scored for the side to move after the root move.
+        sign = -1 if state.maxs_turn else 1
+        if sign < 0:
+            alpha, beta = -beta, -alpha
+        # An interrupted search leaves its moves applied, so work on a copy.
+        state = state.myclone()
+        self.game.make_move(state, action)
+        try:
+            return sign * self._negamax(state, alpha, beta, offset + 1, 1, None)
+        finally:
+            self._deadline = None
+            self._node_limit = None
+            self._next_check = self.INF
+
+    def _check_budget(self):
+        """ Raise SearchTimeout once the time or node budget is spent,
+            or the search has been stopped.
+        """
+        if self.stopped:
+            raise SearchTimeout()
+        if self._node_limit is not None and self.nodes_expanded >= self._node_limit:
+            raise SearchTimeout()
+        if self._deadline is not None and current_time() >= self._deadline:
+            raise SearchTimeout()
+        self._next_check = self.nodes_expanded + self.CHECK_INTERVAL
+        if self._node_limit is not None:
+            self._next_check = min(self._next_check, self._node_limit)
+
+    def _root_order(self, state, first_move, exclude=()):
+        """ Root moves, with the previous iteration's best move first and the
+            excluded moves left out.
+        """
+        actions = self.game.actions(state)
+        if exclude:
+            actions = [action for action in actions if action not in exclude]
+        actions = self._order_moves(state, actions, 0, first_move)
+        if first_move in actions:
+            actions.remove(first_move)
+            actions.insert(0, first_move)
+        return actions
+
+    def _order_moves(self, state, actions, ply, tt_move):
+        """ Sort moves so the likeliest cutoffs are searched first:
+            the transposition table move, captures (cheapest for the Titan Hero
+            first on his turn, costliest first on the enemy's), killer moves,
+            then quiet moves by history score. Ties keep generation order.
+        """
+        if not self.ordering:
+            return actions
+        capture_damage = self.game.capture_damage
+        killers = self.killers.get(ply, ())
+        history = self.history
+        titan = state.maxs_turn
+
+        def score(action):
+            if action == tt_move:
+                return 3 * self.INF
+            damage = capture_damage(state, action)
+            if damage is not None:
+                return 2 * self.INF + (-damage if titan else damage)
+            if action in killers:
+                return self.INF - killers.index(action)
+            return history.get(action, 0)
 
-        best_value = self.INF
+        return sorted(actions, key=score, reverse=True)
+
+    def _record_cutoff(self, state, action, depth, ply):
+        """ Remember a quiet move that caused a beta cutoff as a killer for
+            this ply and credit it in the history table.
+        """
+        if not self.ordering or self.game.capture_damage(state, action) is not None:
+            return
+        killers = self.killers.setdefault(ply, [])
+        if action not in killers:
+            killers.insert(0, action)
+            del killers[self.KILLERS_PER_PLY:]
+        draft = self._draft(depth)
+        self.history[action] = self.history.get(action, 0) + draft * draft
+
+    def _root_search(self, state, depth, first_move=None, alpha=-INF, beta=INF, exclude=()):
+        """ Search every move of the side to move to the given depth limit,
+            within the window (alpha, beta), from that side's point of view.
+            Depths are shifted so cutoff_test stops the search at this limit.
+            :param exclude: root moves to leave out; the result is then not
+                            the root's value and is not stored
+            :return: (best value, best move, principal variation); a value
+                     outside the window is only a bound
+        """
+        offset = self.game.depth_limit - depth
+        alpha_orig = alpha
+        best_value = -self.INF
         best_move = None
-        alpha = -self.INF
-        beta = self.INF
+        pv = []
 
-        for action in self.game.actions(state):
-            value = self._max_value(self.game.result(state, action), alpha, beta, 1)
-            if value < best_value:
+        for i, action in enumerate(self._root_order(state, first_move, exclude)):
+            undo = self.game.make_move(state, action)
+            child_pv = []
+            if i == 0:
+                value = -self._negamax(state, -beta, -alpha, offset + 1, 1, child_pv)
+            else:
+                value = -self._negamax(state, -math.nextafter(alpha, math.inf), -alpha, offset + 1, 1, None)
+                if alpha < value < beta:
+                    value = -self._negamax(state, -beta, -alpha, offset + 1, 1, child_pv)
+            self.game.unmake_move(state, undo)
+            if value > best_value:
                 best_value = value
                 best_move = action
-            beta = min(beta, best_value)
+                pv = [action] + child_pv
+            if best_value >= beta:
+                break
+            alpha = max(alpha, best_value)
 
-        elapsed = current_time() - start_time
-        if best_move is None:
-            legal_moves = self.game.actions(state)
-            if legal_moves:
-                best_move = legal_moves[0]
+        if not exclude:
+            self._store(state, offset, best_value, self._flag(best_value, alpha_orig, beta), best_move)
+        return best_value, best_move, pv
+
+    def _draft(self, depth):
+        """ Number of plies still to be searched below a node at this depth.
+        """
+        return self.game.depth_limit - depth + 1
+
+    def _store(self, state, depth, value, flag, move):
+        self.transposition_table.store(self.game.transposition_key(state),
+                                       self._draft(depth), value, flag, move)
+
+    def _probe(self, state, alpha, beta, depth):
+        """ Look the state up in the transposition table and narrow the window.
+            :return: (value or None, alpha, beta, best move); a value means the
+                     stored result already settles this node.
+        """
+        entry = self.transposition_table.probe(self.game.transposition_key(state), self._draft(depth))
+        if entry is None:
+            return None, alpha, beta, None
+        if entry[1] >= self._draft(depth):
+            stored, flag = entry[2], entry[3]
+            if flag == EXACT:
+                return stored, alpha, beta, entry[4]
+            if flag == LOWER:
+                alpha = max(alpha, stored)
             else:
-                raise ValueError("No legal moves available.")
-        return SearchResult(best_value, best_move, elapsed, self.nodes_expanded)
-
-    def _max_value(self, state, alpha, beta, depth):
-        string = self.game.transposition_string(state)
-        if string in self.transposition_table:
-            return self.transposition_table[string]
-        if self.game.is_terminal(state):
-            return self.game.utility(state)
-        if self.game.cutoff_test(state, depth):
-            return self.game.eval(state)
-        
+                beta = min(beta, stored)
+            if alpha >= beta:
+                return stored, alpha, beta, entry[4]
+        return None, alpha, beta, entry[4]
+
+    @staticmethod
+    def _flag(value, alpha, beta):
+        """ Bound type of a fail-soft result searched with the window (alpha, beta).
+        """
+        if value <= alpha:
+            return UPPER
+        if value >= beta:
+            return LOWER
+        return EXACT
+
+    def _negamax(self, state, alpha, beta, depth, ply, pv):
+        """ Value of the state for the side to move, searched with the window
+            (alpha, beta). After the first move, moves are only tested against
+            alpha with a null window (alpha, the next float up) and searched
+            again with the full window if they beat it.
+            :param ply: distance from the root, which an extension makes
+                        differ from the depth
+            :param pv: list to fill with the principal variation, or None
+                       in a null-window search
+        """
+        game = self.game
+        sign = 1 if state.maxs_turn else -1
+        if game.is_terminal(state):
+            # Capturing the Pantheon ends the game without passing the turn,
+            # so the side to move there is the Legion.
+            return (-1 if state.cachedOutcome else sign) * game.utility(state)
+        if not state.lesser_occ and self.tablebase is not None:
+            score = self.tablebase.score(state)
+            if score is not None:
+                return sign * score
+        if game.cutoff_test(state, depth):
+            return sign * game.eval(state)
+        if pv is None:
+            stored, alpha, beta, tt_move = self._probe(state, alpha, beta, depth)
+            if stored is not None:
+                return stored
+        else:
+            # No cutoffs from the table in a principal variation node, so the
+            # variation is always complete; the stored move is still tried first.
+            entry = self.transposition_table.probe(game.transposition_key(state), self._draft(depth))
+            tt_move = entry[4] if entry is not None else None
+
+        alpha_orig = alpha
         value = -self.INF
+        best_move = None
         self.nodes_expanded += 1
-        for action in self.game.actions(state):
-            value = max(value, self._min_value(self.game.result(state, action), alpha, beta, depth+1))
+        if self.nodes_expanded >= self._next_check:
+            self._check_budget()
+        actions = self._order_moves(state, game.actions(state), ply, tt_move)
+
+        titan = state.maxs_turn
+        draft = self._draft(depth)
+        # Futility: a node just above the leaves whose static value is so far
+        # below alpha that no move without combat can bring it back (the
+        # margin covers a Pantheon step and its shot) only searches combat.
+        futile = None
+        if self.futility and draft == 1 and pv is None \
+                and not (titan and game.pantheon_sees_titan(state)):
+            margin = sign * game.eval(state) + self.FUTILITY_MARGIN
+            if margin <= alpha:
+                futile = margin
+        if draft == 1 and self.batch_eval is not None and (titan or not self.extensions):
+            return self._leaf_batch(state, actions, alpha, beta, depth, ply, pv, futile)
+        reduce = self.reductions and not titan and draft >= self.LMR_MIN_DRAFT
+
+        child_pv = None
+        for i, action in enumerate(actions):
+            if futile is not None and game.capture_damage(state, action) is None:
+                value = max(value, futile)
+                continue
+            undo = game.make_move(state, action)
+            # A quiet move neither fights nor, for the Legion, lets the Pantheon shoot.
+            quiet = undo[3] is None and (titan or not undo[4])
+            child_depth = depth + 1
+            if self.extensions and not titan and self._extended < self.MAX_EXTENSIONS \
+                    and game.pantheon_sees_titan(state):
+                # The Titan Hero is under fire: search his way out one ply deeper.
+                child_depth = depth
+                self._extended += 1
+            if pv is not None:
+                child_pv = []
+            if i == 0:
+                child = -self._negamax(state, -beta, -alpha, child_depth, ply + 1, child_pv)
+            else:
+                null = -math.nextafter(alpha, math.inf)
+                child = None
+                if reduce and quiet and i >= self.LMR_MIN_INDEX:
+                    # Late quiet Legion move: try it one ply shallower first.
+                    child = -self._negamax(state, null, -alpha, child_depth + 1, ply + 1, None)
+                if child is None or child > alpha:
+                    child = -self._negamax(state, null, -alpha, child_depth, ply + 1, None)
+                    if alpha < child < beta:
+                        child = -self._negamax(state, -beta, -alpha, child_depth, ply + 1, child_pv)
+            if child_depth == depth:
+                self._extended -= 1
+            game.unmake_move(state, undo)
+            if child > value:
+                value = child
+                best_move = action
+                if pv is not None and value > alpha:
+                    pv[:] = [action] + child_pv
             if value >= beta:
-                self.transposition_table[string] = value
+                self._record_cutoff(state, action, depth, ply)
+                self._store(state, depth, value, LOWER, best_move)
                 return value
             alpha = max(alpha, value)
-        self.transposition_table[string] = value
+        self._store(state, depth, value, EXACT if value > alpha_orig else UPPER, best_move)
         return value
 
-    def _min_value(self, state, alpha, beta, depth):
-        string = self.game.transposition_string(state)
-        if string in self.transposition_table:
-            return self.transposition_table[string]
-        if self.game.is_terminal(state):
-            return self.game.utility(state)
-        if self.game.cutoff_test(state, depth):
-            return self.game.eval(state)
+    def _leaf_batch(self, state, actions, alpha, beta, depth, ply, pv, futile):
+        """ The move loop of _negamax for a node whose children are all
+            leaves: every child is played first, the ones to evaluate are
+            scored in one batch, then the values are taken in move order with
+            the same cutoffs. A leaf's value does not depend on its window,
+            so the result is exactly that of the loop in _negamax.
+        """
+        game = self.game
+        batch_eval = self.batch_eval
+        values = [None] * len(actions)
+        rows, batched = [], []
+        for i, action in enumerate(actions):
+            if futile is not None and game.capture_damage(state, action) is None:
+                continue
+            undo = game.make_move(state, action)
+            sign = 1 if state.maxs_turn else -1
+            if game.is_terminal(state):
+                values[i] = -(-1 if state.cachedOutcome else sign) * game.utility(state)
+            else:
+                score = None
+                if not state.lesser_occ and self.tablebase is not None:
+                    score = self.tablebase.score(state)
+                if score is not None:
+                    values[i] = -sign * score
+                else:
+                    rows.append(batch_eval.encode(state))
+                    batched.append((i, sign))
+            game.unmake_move(state, undo)
+        if rows:
+            for (i, sign), score in zip(batched, batch_eval.evaluate(rows).tolist()):
+                values[i] = -(sign * score)
 
-        value = self.INF
-        self.nodes_expanded += 1
-        for action in self.game.actions(state):
-            value = min(value, self._max_value(self.game.result(state, action), alpha, beta, depth+1))
-            if value <= alpha:
-                self.transposition_table[string] = value
+        alpha_orig = alpha
+        value = -self.INF
+        best_move = None
+        for action, child in zip(actions, values):
+            if child is None:
+                value = max(value, futile)
+                continue
+            if child > value:
+                value = child
+                best_move = action
+                if pv is not None and value > alpha:
+                    pv[:] = [action]
+            if value >= beta:
+                self._record_cutoff(state, action, depth, ply)
+                self._store(state, depth, value, LOWER, best_move)
                 return value
-            beta = min(beta, value)
-        self.transposition_table[string] = value
+            alpha = max(alpha, value)
+        self._store(state, depth, value, EXACT if value > alpha_orig else UPPER, best_move)
         return value
@@ -0,0 +1,86 @@
+"""
+Batch analysis of recorded games: search every position of a GameRecord
+file and report the engine's choice next to the move that was played.
+
+With --cache, search results are kept in a PersistentTranspositionTable
+file, so analysing the same games again mostly reads them back instead of
+searching. Only results of exactly the draft being searched are read back,
+so a run at one --depth does not pick up deeper results from another.
+Values can still differ slightly between a cold and a warm cache, as they
+do with a larger in-memory table: which results are at hand changes which
+table cutoffs the search takes.
+"""
+import argparse
+import json
+
+import AlphaBeta
+import Chess
+import GameRecord
+from AlphaBeta import current_time
+from Transposition import PersistentTranspositionTable
+
+
+def cache_tag(game, searcher):
+    """ What cached values depend on besides the position: the board, the
+        army and the selective search settings.
+    """
+    selective = ",".join(f for f in ("reductions", "futility", "extensions") if getattr(searcher, f))
+    return f"dim={game.dim} titans={len(game.lesser_titans)} selective={selective}"
+
+
+def analyse(path, searcher, out=None):
+    """ Search every non-terminal position of a record file with searcher.
+        :param out: file to write one JSON line per position to, or None
+        :return: summary of the run
+    """
+    game = searcher.game
+    positions = nodes = agreed = 0
+    start = current_time()
+    for number, state, played in GameRecord.replay(path, game):
+        if played is None:
+            continue
+        res = searcher.choose_move_max(state) if state.maxs_turn else searcher.choose_move_min(state)
+        positions += 1
+        nodes += res.nodes
+        agreed += res.move == played
+        if out is not None:
+            out.write(json.dumps({"game": number, "ply": state.moves_made, "state": str(state),
+                                  "played": played, "best": res.move, "value": res.value,
+                                  "lines": [{"value": v, "pv": pv} for v, pv in res.lines]},
+                                 separators=(",", ":")) + "\n")
+    elapsed = current_time() - start
+    return {"positions": positions, "nodes": nodes, "time": elapsed,
+            "nodes_per_position": nodes / positions if positions else 0.0,
+            "agreement": agreed / positions if positions else 0.0,
+            "table": searcher.transposition_table.stats()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search every position of a game record file.")
+    parser.add_argument("path", help="GameRecord file")
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--multipv", type=int, default=1, help="best moves to rank in each position")
+    parser.add_argument("--cache", metavar="FILE", help="persistent position cache to read and fill")
+    parser.add_argument("--cache-entries", type=int, default=1 << 20, help="most positions the cache keeps")
+    parser.add_argument("--out", help="write one JSON line per position to this file")
+    args = parser.parse_args(argv)
+
+    dim, titans = GameRecord.read_header(args.path)
+    game = Chess.Game(dim, depthlimit=args.depth, titans=titans)
+    searcher = AlphaBeta.MiniMax(game, multipv=args.multipv)
+    if args.cache:
+        searcher.transposition_table = PersistentTranspositionTable(
+            args.cache, max_entries=args.cache_entries, tag=cache_tag(game, searcher), exact_depth=True)
+    out = open(args.out, "w") if args.out else None
+    try:
+        summary = analyse(args.path, searcher, out)
+    finally:
+        if out is not None:
+            out.close()
+        if args.cache:
+            searcher.transposition_table.close()
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
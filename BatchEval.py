@@ -0,0 +1,212 @@
+"""
+Batched leaf evaluation with NumPy.
+
+Game.eval scores one state at a time. BatchEvaluator encodes states as rows
+of small integers and scores a whole batch with array operations, giving
+exactly the same floats as Game.eval. MiniMax uses it, when given one, to
+score all the leaves below a node together.
+"""
+import argparse
+import random
+import sys
+
+import numpy as np
+
+import AlphaBeta
+import Chess
+from AlphaBeta import current_time
+
+
+class BatchEvaluator:
+    """
+    Evaluates batches of states for one game.
+
+    A state is encoded as the square of every piece (-1 once it is removed),
+    the Titan Hero first, then the Pantheon and the game's lesser titans,
+    followed by its life and its emblems as a bitmask. evaluate() takes a
+    list of encoded states and works out every term of Game.eval for all of
+    them at once, line of sight included: a lesser titan blocks the
+    Pantheon's shot when it stands on the line strictly between the two.
+    The terms are combined in the same order and with the same float64
+    operations as Game.eval, so the scores are identical, not just close.
+    """
+    # The weights of Game.eval.
+    LIFE_WEIGHT = 1.0
+    ENEMY_WEIGHT = 20.0
+    DISTANCE_WEIGHT = 1.5
+    EMBLEM_WEIGHT = 5.0
+    BONUS_CAPTURE_PANTHEON = 50.0
+    DIVINE_SMITE_PENALTY = 15.0
+    PANTHEON_MOVE_PENALTY = 40.0
+
+    def __init__(self, game):
+        self.game = game
+        self.dim = game.dim
+        self.ideal_pantheon = game.ideal_pantheon
+        self.pieces = ('T', 'P') + game.lesser_titans
+        self.emblem_bits = {p: 1 << i for i, p in enumerate(game.lesser_titans)}
+        self.leaves = 0         # states evaluated so far
+        self.batches = 0
+
+    def encode(self, state):
+        """ One state as a row: the piece squares, life and emblem bitmask.
+        """
+        boards = state.boards
+        row = [boards[p].bit_length() - 1 if p in boards else -1 for p in self.pieces]
+        row.append(state.life)
+        row.append(sum(self.emblem_bits[p] for p in state.emblems))
+        return row
+
+    def evaluate(self, rows):
+        """ Game.eval of every encoded state.
+            :return: float64 array, one score per row
+        """
+        self.leaves += len(rows)
+        self.batches += 1
+        columns = len(self.pieces)
+        data = np.array(rows, dtype=np.int64).reshape(len(rows), columns + 2)
+        squares = data[:, :columns]
+        life = data[:, columns]
+        emblem_mask = data[:, columns + 1]
+
+        alive = squares >= 0
+        rows_, cols = np.divmod(squares, self.dim)
+        t_row, t_col = rows_[:, :1], cols[:, :1]
+        p_row, p_col = rows_[:, 1], cols[:, 1]
+        lesser_alive = alive[:, 2:]
+        lesser_row, lesser_col = rows_[:, 2:], cols[:, 2:]
+
+        has_pantheon = alive[:, 1]
+        lesser_count = lesser_alive.sum(axis=1)
+        enemy_count = lesser_count + has_pantheon
+        distance_sum = np.where(lesser_alive, np.abs(lesser_row - t_row) + np.abs(lesser_col - t_col), 0).sum(axis=1)
+        avg_distance = np.where(lesser_count > 0, distance_sum / np.maximum(lesser_count, 1), 0.0)
+        emblem_count = np.zeros_like(emblem_mask)
+        for bit in self.emblem_bits.values():
+            emblem_count += (emblem_mask & bit) != 0
+
+        score = self.LIFE_WEIGHT * life
+        score = score - self.ENEMY_WEIGHT * enemy_count
+        score = score - self.DISTANCE_WEIGHT * avg_distance
+        score = score + self.EMBLEM_WEIGHT * emblem_count
+
+        # Terms that only apply while the Pantheon is on the board.
+        pantheon_distance = np.abs(t_row[:, 0] - p_row) + np.abs(t_col[:, 0] - p_col)
+        bonus = has_pantheon & (lesser_count == 0)
+        score = np.where(bonus, score + self.BONUS_CAPTURE_PANTHEON / (pantheon_distance + 1), score)
+        sees = has_pantheon & self.line_of_sight(t_row[:, 0], t_col[:, 0], p_row, p_col,
+                                                 lesser_alive, lesser_row, lesser_col)
+        score = np.where(sees, score - self.DIVINE_SMITE_PENALTY, score)
+        displacement = np.abs(p_row - self.ideal_pantheon[0]) + np.abs(p_col - self.ideal_pantheon[1])
+        score = np.where(has_pantheon, score - self.PANTHEON_MOVE_PENALTY * displacement, score)
+        return score
+
+    @staticmethod
+    def line_of_sight(t_row, t_col, p_row, p_col, alive, row, col):
+        """ True where the Pantheon and the Titan Hero share a row, column or
+            diagonal and no live piece stands strictly between them.
+        """
+        dr, dc = t_row - p_row, t_col - p_col
+        aligned = (dr == 0) | (dc == 0) | (np.abs(dr) == np.abs(dc))
+        span = np.maximum(np.abs(dr), np.abs(dc))
+        step_r, step_c = np.sign(dr)[:, None], np.sign(dc)[:, None]
+        # A piece is between if it is t steps along the line from the Pantheon, 0 < t < span.
+        off_r, off_c = row - p_row[:, None], col - p_col[:, None]
+        t = np.maximum(np.abs(off_r), np.abs(off_c))
+        between = alive & (off_r == t * step_r) & (off_c == t * step_c) & (t > 0) & (t < span[:, None])
+        return aligned & (span > 0) & ~between.any(axis=1)
+
+    def evaluate_states(self, states):
+        return self.evaluate([self.encode(state) for state in states])
+
+
+def random_states(game, count, seed=0, max_plies=60):
+    """ States reached by random play from the initial state, for testing and
+        timing; terminal states are skipped.
+    """
+    rng = random.Random(seed)
+    states = []
+    while len(states) < count:
+        state = game.initial_state()
+        for _ in range(rng.randrange(max_plies)):
+            actions = game.actions(state)
+            if not actions:
+                break
+            game.make_move(state, rng.choice(actions))
+            if game.is_terminal(state):
+                break
+        if not game.is_terminal(state):
+            states.append(state)
+    return states
+
+
+def compare_eval(game, states, repeat=3):
+    """ Score the states one by one with Game.eval and in one batch, check the
+        scores are identical and time both.
+        :return: (mismatches, scalar leaves/sec, batch leaves/sec including encoding)
+    """
+    evaluator = BatchEvaluator(game)
+    scalar_time = batch_time = None
+    for _ in range(repeat):
+        start = current_time()
+        scalar = [game.eval(state) for state in states]
+        elapsed = current_time() - start
+        scalar_time = elapsed if scalar_time is None else min(scalar_time, elapsed)
+        start = current_time()
+        batch = evaluator.evaluate_states(states)
+        elapsed = current_time() - start
+        batch_time = elapsed if batch_time is None else min(batch_time, elapsed)
+    mismatches = sum(1 for a, b in zip(scalar, batch.tolist()) if a != b)
+    return mismatches, len(states) / scalar_time, len(states) / batch_time
+
+
+def compare_search(state, depth):
+    """ Search a state to a fixed depth with and without leaf batching.
+        :return: (scalar result, batched result, scalar leaves, batched leaves)
+    """
+    game = Chess.Game(depthlimit=depth)
+    leaves = 0
+    scalar_eval = game.eval
+
+    def counted(s):
+        nonlocal leaves
+        leaves += 1
+        return scalar_eval(s)
+
+    game.eval = counted
+    scalar = AlphaBeta.MiniMax(game).choose_move(state)
+    del game.eval
+
+    evaluator = BatchEvaluator(game)
+    batched = AlphaBeta.MiniMax(game, batch_eval=evaluator).choose_move(state)
+    return scalar, batched, leaves, evaluator.leaves
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check and time batched leaf evaluation against Game.eval.")
+    parser.add_argument("--states", type=int, default=20000, help="random states for the eval comparison")
+    parser.add_argument("--depth", type=int, default=4, help="search depth for the search comparison")
+    parser.add_argument("--searches", type=int, default=5, help="random positions searched")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    game = Chess.Game()
+    states = random_states(game, args.states, args.seed)
+    mismatches, scalar_rate, batch_rate = compare_eval(game, states)
+    print(f"eval: {len(states)} states, {mismatches} mismatches, "
+          f"scalar {scalar_rate:.0f} leaves/sec, batch {batch_rate:.0f} leaves/sec")
+
+    failed = mismatches > 0
+    for state in [game.initial_state()] + random_states(game, args.searches - 1, args.seed + 1):
+        scalar, batched, scalar_leaves, batched_leaves = compare_search(state, args.depth)
+        same = (scalar.value, scalar.move, scalar.nodes) == (batched.value, batched.move, batched.nodes)
+        failed |= not same
+        print(f"search {state}: {'same' if same else 'DIFFERENT'} value {scalar.value:g} move {scalar.move}, "
+              f"scalar {scalar_leaves} leaves {scalar_leaves / scalar.elapsed_time:.0f}/sec, "
+              f"batched {batched_leaves} leaves {batched_leaves / batched.elapsed_time:.0f}/sec "
+              f"({scalar.elapsed_time:.3f}s vs {batched.elapsed_time:.3f}s)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
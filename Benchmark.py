@@ -0,0 +1,245 @@
+import argparse
+import json
+import platform
+import random
+import sys
+
+import AlphaBeta
+import Chess
+from AlphaBeta import current_time
+
+# Fixed benchmark positions: pieces, life, emblems, side to move and the depth
+# limits searched from each. Hand-placed so they never depend on move ordering.
+POSITIONS = {
+    "opening": {"pieces": None, "life": 75, "emblems": (), "maxs_turn": True, "depths": (1, 2, 3, 4)},
+    "midgame": {"pieces": {"T": (3, 3), "P": (0, 3), "E": (2, 4), "F": (1, 5), "G": (3, 6), "H": (2, 7)},
+                "life": 48, "emblems": ("A", "B", "C", "D"), "maxs_turn": True, "depths": (1, 2, 3, 4)},
+    "midgame_legion": {"pieces": {"T": (3, 3), "P": (0, 3), "E": (2, 5), "F": (1, 5), "G": (3, 6), "H": (2, 7)},
+                       "life": 45, "emblems": ("A", "B", "C", "D"), "maxs_turn": False, "depths": (1, 2, 3)},
+    "endgame": {"pieces": {"T": (5, 2), "P": (1, 4)}, "life": 20, "emblems": Chess.LESSER_TITANS,
+                "maxs_turn": True, "depths": (1, 2, 3, 4, 5, 6)},
+}
+PERFT_DEPTH = 3
+REPEAT = 3
+# Board sizes for the scaling benchmark, each with as many lesser titans as columns.
+SCALING_DIMS = (8, 12, 16)
+SCALING_PLIES = 100
+
+
+def best_time(fn, repeat):
+    """ Run fn repeat times and return (its result, the fastest time).
+    """
+    best = None
+    for _ in range(repeat):
+        start = current_time()
+        result = fn()
+        elapsed = current_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def build_position(game, name):
+    spec = POSITIONS[name]
+    if spec["pieces"] is None:
+        return game.initial_state(starting_life=spec["life"])
+    return game.state_from_positions(spec["pieces"], spec["life"], spec["emblems"], spec["maxs_turn"])
+
+
+def perft(game, state, depth):
+    """ Count the leaf nodes of the full move tree to the given depth,
+        exercising actions, make_move and unmake_move.
+    """
+    if depth == 0 or game.is_terminal(state):
+        return 1
+    total = 0
+    for action in game.actions(state):
+        undo = game.make_move(state, action)
+        total += perft(game, state, depth - 1)
+        game.unmake_move(state, undo)
+    return total
+
+
+def bench_perft(game, state, max_depth, repeat=REPEAT):
+    results = []
+    for depth in range(1, max_depth + 1):
+        nodes, elapsed = best_time(lambda: perft(game, state.myclone(), depth), repeat)
+        results.append({"depth": depth, "nodes": nodes, "time": elapsed,
+                        "nps": nodes / elapsed if elapsed else 0.0})
+    return results
+
+
+def bench_search(state, depths, repeat=REPEAT, **game_options):
+    """ Time-to-depth for MiniMax: a fresh searcher per run, so node counts
+        are reproducible.
+        :param game_options: board size and army of the game, as for Chess.Game
+    """
+    results = []
+    for depth in depths:
+        game = Chess.Game(depthlimit=depth, **game_options)
+
+        def search():
+            searcher = AlphaBeta.MiniMax(game)
+            return searcher.choose_move_max(state) if state.maxs_turn else searcher.choose_move_min(state)
+
+        res, elapsed = best_time(search, repeat)
+        results.append({"depth": depth, "nodes": res.nodes, "time": elapsed,
+                        "nps": res.nodes / elapsed if elapsed else 0.0,
+                        "move": list(res.move), "value": res.value})
+    return results
+
+
+def bench_make_unmake(game, state, plies=SCALING_PLIES, repeat=REPEAT):
+    """ Time make_move/unmake_move pairs for every move of the positions
+        along a fixed random line of play from the state.
+        :return: (number of pairs, seconds per pair)
+    """
+    rng = random.Random(0)
+    positions = []
+    state = state.myclone()
+    for _ in range(plies):
+        if game.is_terminal(state):
+            break
+        actions = game.actions(state)
+        positions.append((state.myclone(), actions))
+        game.make_move(state, rng.choice(actions))
+
+    def make_unmake():
+        for position, actions in positions:
+            for action in actions:
+                game.unmake_move(position, game.make_move(position, action))
+        return sum(len(actions) for _, actions in positions)
+
+    pairs, elapsed = best_time(make_unmake, repeat)
+    return pairs, elapsed / pairs
+
+
+def scaling(dims=SCALING_DIMS, perft_depth=2, search_depth=3, repeat=REPEAT):
+    """ Per-node costs from the initial position of games on growing boards,
+        each with as many lesser titans as the board has columns. Branching
+        grows with the army, so perft and search speeds are per node; the
+        make/unmake time is the cost of one move, whatever the size.
+    """
+    report = {"python": platform.python_version(), "machine": platform.machine(), "sizes": {}}
+    for dim in dims:
+        game = Chess.Game(dim, titans=dim)
+        state = game.initial_state()
+        legion = state.myclone()
+        legion.maxs_turn = False
+        pairs, per_pair = bench_make_unmake(game, state, repeat=repeat)
+        perft_rows = bench_perft(game, state, perft_depth, repeat)
+        search_rows = bench_search(state, [search_depth], repeat, dim=dim, titans=dim)
+        report["sizes"][f"{dim}x{dim}"] = {
+            "titans": dim, "titan_moves": len(game.actions(state)), "legion_moves": len(game.actions(legion)),
+            "make_unmake_us": per_pair * 1e6, "make_unmake_pairs": pairs,
+            "perft": perft_rows, "perft_nps": totals(perft_rows),
+            "search": search_rows, "search_nps": totals(search_rows)}
+        print(f"{dim}x{dim}: done", file=sys.stderr)
+    return report
+
+
+def totals(rows):
+    """ Overall nodes per second of a set of timed rows; short runs are too
+        noisy to compare one by one.
+    """
+    nodes = sum(row["nodes"] for row in rows)
+    elapsed = sum(row["time"] for row in rows)
+    return nodes / elapsed if elapsed else 0.0
+
+
+def run(names=None, perft_depth=PERFT_DEPTH, max_search_depth=None, repeat=REPEAT):
+    game = Chess.Game()
+    report = {"python": platform.python_version(), "machine": platform.machine(), "positions": {}}
+    for name in names or POSITIONS:
+        state = build_position(game, name)
+        depths = [d for d in POSITIONS[name]["depths"] if max_search_depth is None or d <= max_search_depth]
+        result = {"perft": bench_perft(game, state, perft_depth, repeat),
+                  "search": bench_search(state, depths, repeat)}
+        result["perft_nps"] = totals(result["perft"])
+        result["search_nps"] = totals(result["search"])
+        report["positions"][name] = result
+        print(f"{name}: done", file=sys.stderr)
+    return report
+
+
+def compare(report, baseline, threshold):
+    """ Compare a report against a baseline.
+        Node counts, moves and values must match exactly, since they only change
+        when move generation or the search changes. Overall nodes per second
+        of each position may not drop by more than threshold (a fraction).
+        :return: list of problems found; empty if none
+    """
+    problems = []
+    for name, current in report["positions"].items():
+        base = baseline["positions"].get(name)
+        if base is None:
+            continue
+        for kind in ("perft", "search"):
+            base_rows = {row["depth"]: row for row in base[kind]}
+            for row in current[kind]:
+                old = base_rows.get(row["depth"])
+                if old is None:
+                    continue
+                where = f"{name} {kind} depth {row['depth']}"
+                for field in ("nodes", "move", "value"):
+                    if field in old and row[field] != old[field]:
+                        problems.append(f"{where}: {field} changed {old[field]} -> {row[field]}")
+            key = f"{kind}_nps"
+            if base.get(key) and current[key] < base[key] * (1 - threshold):
+                problems.append(f"{name} {kind}: nps dropped {base[key]:.0f} -> {current[key]:.0f}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move generation and search benchmarks.")
+    parser.add_argument("--out", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="baseline JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="allowed fractional drop in nodes per second (default 0.15)")
+    parser.add_argument("--save-baseline", metavar="FILE", help="write the report as a new baseline")
+    parser.add_argument("--positions", nargs="*", choices=list(POSITIONS), help="subset of positions")
+    parser.add_argument("--perft-depth", type=int, default=PERFT_DEPTH)
+    parser.add_argument("--max-depth", type=int, default=None, help="deepest search depth to time")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="runs per measurement; the fastest counts")
+    parser.add_argument("--scaling", type=int, nargs="*", metavar="DIM",
+                        help="per-node costs on DIMxDIM boards with DIM lesser titans instead "
+                             f"(default sizes {' '.join(map(str, SCALING_DIMS))})")
+    args = parser.parse_args(argv)
+
+    if args.scaling is not None:
+        report = scaling(args.scaling or SCALING_DIMS, repeat=args.repeat)
+        print(json.dumps(report, indent=1))
+        for size, result in report["sizes"].items():
+            print(f"{size:7} {result['titans']:2} titans, {result['legion_moves']:3} Legion moves: "
+                  f"make/unmake {result['make_unmake_us']:6.2f} us, perft {result['perft_nps']:8.0f} nps, "
+                  f"search {result['search_nps']:7.0f} nps", file=sys.stderr)
+        return 0
+
+    report = run(args.positions, args.perft_depth, args.max_depth, args.repeat)
+    text = json.dumps(report, indent=1)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            f.write(text + "\n")
+    if not args.out and not args.save_baseline:
+        print(text)
+
+    for name, result in report["positions"].items():
+        for row in result["search"]:
+            print(f"{name:15} depth {row['depth']}: {row['nodes']:7} nodes {row['time']:7.3f}s "
+                  f"{row['nps']:8.0f} nps", file=sys.stderr)
+        print(f"{name:15} perft {result['perft_nps']:8.0f} nps, search {result['search_nps']:8.0f} nps",
+              file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(report, json.load(f), args.threshold)
+        for problem in problems:
+            print("REGRESSION:", problem, file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
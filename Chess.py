@@ -1,41 +1,197 @@
 import random as rand
+import string
+from functools import lru_cache
+
+# Lesser titan names: capital letters, except P and T, which name the
+# Pantheon and the Titan Hero.
+TITAN_NAMES = tuple(c for c in string.ascii_uppercase if c not in "PT")
+LESSER_TITANS = TITAN_NAMES[:8]
+ENEMIES = LESSER_TITANS + ('P',)
+DIRECTIONS = ((-1, 0), (-1, 1), (0, 1), (1, 1),
+              (1, 0), (1, -1), (0, -1), (-1, -1))
+
+# Fixed seed so Zobrist keys are identical in every process and every run.
+ZOBRIST_SEED = 0x54495441
+MASK64 = (1 << 64) - 1
+
+
+def square_bit(r, c, dim):
+    """ Return the single-bit mask for square (r, c) on a dim x dim board.
+        Squares are numbered row-major, so any dim fits in a Python int.
+    """
+    return 1 << (r * dim + c)
+
+
+def bit_square(bit, dim):
+    """ Return the (row, col) of a single-bit square mask.
+    """
+    return divmod(bit.bit_length() - 1, dim)
+
+
+def mix64(x):
+    """ SplitMix64 finaliser: scramble an integer into a well-distributed 64-bit key.
+    """
+    x = (x + 0x9E3779B97F4A7C15) & MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+
+def lesser_titan_names(count):
+    """ The names of an army of count lesser titans, in weakness-cycle order.
+    """
+    if not 0 < count <= len(TITAN_NAMES):
+        raise ValueError(f"between 1 and {len(TITAN_NAMES)} lesser titans are supported")
+    return TITAN_NAMES[:count]
+
+
+def start_positions(dim, lesser_titans):
+    """ The starting (row, col) of every piece: the Titan Hero in the middle
+        of the bottom row, the Pantheon in the middle of the top row and the
+        lesser titans in the rows below it, filled from row 1 and centred
+        on a row they do not fill.
+    """
+    count = len(lesser_titans)
+    if dim < 4 or count > dim * (dim - 3):
+        raise ValueError(f"{count} lesser titans do not fit on a {dim}x{dim} board")
+    middle = dim // 2 - 1
+    positions = {'T': (dim - 1, middle), 'P': (0, middle)}
+    offset = (dim - count) // 2 if count < dim else 0
+    for i, p in enumerate(lesser_titans):
+        positions[p] = (1 + i // dim, offset + i % dim)
+    return positions
+
+
+@lru_cache(maxsize=None)
+def board_tables(dim):
+    """ Precompute the move and line-of-sight tables for a dim x dim board.
+        All tables are keyed by square bit.
+        :return: (titan_targets, step_targets, between, manhattan)
+            titan_targets[sq]: (bit, row, col) of every square 1 to 3 steps away
+                               in the 8 directions, in DIRECTIONS order
+            step_targets[sq]:  (bit, row, col) of every neighbouring square
+            between[sq1][sq2]: mask of the squares strictly between two squares
+                               on a common row, column or diagonal; pairs
+                               that are not aligned are absent
+            manhattan[sq1][sq2]: Manhattan distance between two squares
+    """
+    titan_targets, step_targets, between = {}, {}, {}
+    squares = [(square_bit(r, c, dim), r, c) for r in range(dim) for c in range(dim)]
+    manhattan = {sq: {other: abs(r - orow) + abs(c - ocol) for other, orow, ocol in squares}
+                 for sq, r, c in squares}
+    for r in range(dim):
+        for c in range(dim):
+            sq = square_bit(r, c, dim)
+            slides, steps, rays = [], [], {sq: 0}
+            for dr, dc in DIRECTIONS:
+                mask = 0
+                nr, nc = r + dr, c + dc
+                while 0 <= nr < dim and 0 <= nc < dim:
+                    bit = square_bit(nr, nc, dim)
+                    step = max(abs(nr - r), abs(nc - c))
+                    if step == 1:
+                        steps.append((bit, nr, nc))
+                    if step <= 3:
+                        slides.append((bit, nr, nc))
+                    rays[bit] = mask
+                    mask |= bit
+                    nr += dr
+                    nc += dc
+            titan_targets[sq] = tuple(slides)
+            step_targets[sq] = tuple(steps)
+            between[sq] = rays
+    return titan_targets, step_targets, between, manhattan
+
 
 class GameState(object):
     """ The GameState class stores the information about the state of the game.
+        Every piece is kept as a bitboard (an int with one bit set for its square),
+        together with combined occupancy masks so square lookups are mask tests,
+        and an index from square to enemy piece, so finding the piece on a
+        square does not depend on how many pieces there are.
     """
-    
-    def __init__(self, life=75, dim=8):
+    __slots__ = ('dim', 'maxs_turn', 'cachedTerminal', 'cachedOutcome', 'moves_made',
+                 'life', 'boards', 'lesser_occ', 'enemy_occ', 'all_occ', 'enemy_at', 'emblems',
+                 'zobrist', 'lesser_count', 'distance_sum', 'pantheon_displacement')
+
+    def __init__(self, life=75, dim=8, positions=None):
+        """ :param positions: {piece: (row, col)}; by default the starting
+                              squares of the 8 lesser titan game
+        """
         self.dim = dim
         self.maxs_turn = True # true means titan's turn
         self.cachedTerminal = False  
         self.cachedOutcome = None       
         self.moves_made = 0
         self.life = life
-        self.positions = {}
-        
-        self.positions["T"] = (7,3)
-        self.positions["P"] = (0,3)
-        for i, p in enumerate(['A','B','C','D','E','F','G','H']):
-            self.positions[p] = (1,i)
+        if positions is None:
+            positions = start_positions(dim, LESSER_TITANS)
+        self.boards = {p: square_bit(r, c, dim) for p, (r, c) in positions.items()}
+        self.update_occupancy()
         self.emblems = set()
-        self.stringified = str(self)
+        # Derived fields, filled in by Game.sync_state and kept up to date by Game.make_move.
+        self.zobrist = 0
+        self.lesser_count = self.lesser_occ.bit_count()
+        self.distance_sum = 0           # Manhattan distances from Titan Hero to the lesser titans
+        self.pantheon_displacement = 0  # Manhattan distance of the Pantheon from its ideal square
+
+    def update_occupancy(self):
+        """ Rebuild the combined occupancy masks and the square index from the
+            piece bitboards.
+        """
+        lesser = 0
+        enemy_at = {}
+        for p, b in self.boards.items():
+            if p != 'T':
+                enemy_at[b] = p
+                if p != 'P':
+                    lesser |= b
+        self.enemy_at = enemy_at
+        self.lesser_occ = lesser
+        self.enemy_occ = lesser | self.boards.get("P", 0)
+        self.all_occ = self.enemy_occ | self.boards["T"]
+
+    @property
+    def positions(self):
+        """ The (row, col) of every piece still on the board, keyed by piece.
+        """
+        return {p: bit_square(b, self.dim) for p, b in self.boards.items()}
+
+    def position(self, piece):
+        """ Return the (row, col) of the given piece, or None if it was removed.
+        """
+        b = self.boards.get(piece)
+        return bit_square(b, self.dim) if b else None
 
+    def piece_at(self, bit):
+        """ Return the piece standing on the given single-square mask, or None.
+        """
+        piece = self.enemy_at.get(bit)
+        if piece is None and bit and bit == self.boards['T']:
+            return 'T'
+        return piece
 
     def myclone(self):
         """ Make and return an exact copy of the state.
         """
-        new_state = GameState()
-        
-        #TODO: copy portions of the state that need to be copied
-
+        # Bypass __init__ so the initial setup is not rebuilt only to be overwritten.
+        new_state = GameState.__new__(GameState)
         
+        new_state.dim = self.dim
         new_state.life = self.life
         new_state.maxs_turn = self.maxs_turn
         new_state.cachedTerminal = self.cachedTerminal
         new_state.cachedOutcome = self.cachedOutcome
-        new_state.stringified = self.stringified 
+        new_state.zobrist = self.zobrist
+        new_state.lesser_count = self.lesser_count
+        new_state.distance_sum = self.distance_sum
+        new_state.pantheon_displacement = self.pantheon_displacement
         new_state.moves_made = self.moves_made
-        new_state.positions = self.positions.copy()
+        new_state.boards = self.boards.copy()
+        new_state.lesser_occ = self.lesser_occ
+        new_state.enemy_occ = self.enemy_occ
+        new_state.all_occ = self.all_occ
+        new_state.enemy_at = self.enemy_at.copy()
         new_state.emblems = self.emblems.copy()
 
         return new_state
@@ -58,7 +214,8 @@ class GameState(object):
             Could be used as a key for a hash table.  
             :return: A string that describes the board in the current state.
         """
-        pieces_str = ",".join(f"{p}:{self.positions[p][0]}-{self.positions[p][1]}" for p in sorted(self.positions))
+        positions = self.positions
+        pieces_str = ",".join(f"{p}:{positions[p][0]}-{positions[p][1]}" for p in sorted(positions))
         return f"T{self.life}|{'M' if self.maxs_turn else 'E'}|{pieces_str}|Mvs:{self.moves_made}"
     
 
@@ -69,24 +226,126 @@ class Game(object):
     """
     
     
-    def __init__(self, dim=8,depthlimit=0):
+    def __init__(self, dim=8,depthlimit=0, shuffle=False, seed=None, titans=8, weaknesses=None):
         """ Initialization.  
+            :param shuffle: randomize the order of enemy moves, using a
+                            generator seeded with seed, so runs can be repeated
+            :param titans: number of lesser titans, named from A and skipping P and T
+            :param weaknesses: {lesser titan: emblem it is weak to}; by default
+                               each is weak to the one before it, and the
+                               first to the last
         """
         self.dim = dim
         self.depth_limit = depthlimit
+        self.shuffle_rng = rand.Random(seed) if shuffle else None
+        self.lesser_titans = lesser_titan_names(titans)
+        self.enemies = self.lesser_titans + ('P',)
+        self.start = start_positions(dim, self.lesser_titans)
+
+        # Move targets and between-square masks, with the move tuples built once.
+        titan_targets, step_targets, self.between, self.manhattan = board_tables(dim)
+        self.titan_moves = {sq: tuple((bit, ('T', r, c)) for bit, r, c in targets)
+                            for sq, targets in titan_targets.items()}
+        self.step_moves = {p: {sq: tuple((bit, (p, r, c)) for bit, r, c in targets)
+                               for sq, targets in step_targets.items()}
+                           for p in self.enemies}
         
         self.base_dam = 8
         self.weapon_dam = 3
         self.shot_dam = 3
         self.perturn_dam = 1
-        self.weaknesses = { "A":"H", "B":"A", "C":"B", "D":"C", "E":"D", "F":"E", "G":"F", "H":"G"}
+        if weaknesses is None:
+            weaknesses = {p: self.lesser_titans[i - 1] for i, p in enumerate(self.lesser_titans)}
+        elif set(weaknesses) != set(self.lesser_titans) or not set(weaknesses.values()) <= set(self.lesser_titans):
+            raise ValueError("weaknesses must map every lesser titan to a lesser titan")
+        self.weaknesses = weaknesses
+        self.ideal_pantheon = self.start['P']
+        # Distance of every square from the Pantheon's ideal square.
+        self.displacement = self.manhattan[square_bit(self.ideal_pantheon[0], self.ideal_pantheon[1], dim)]
+
+        # Zobrist keys: one per (piece, square) keyed by the square's bit, one per
+        # emblem and one for the side to move. Life keys are derived on demand.
+        rng = rand.Random(ZOBRIST_SEED)
+        squares = [1 << i for i in range(dim * dim)]
+        self.zobrist_pieces = {p: {sq: rng.getrandbits(64) for sq in squares} for p in ('T',) + self.enemies}
+        self.zobrist_emblems = {p: rng.getrandbits(64) for p in self.lesser_titans}
+        self.zobrist_side = rng.getrandbits(64)
+        self.zobrist_life = {}
 
     def initial_state(self, starting_life=75):
         """ Return an initial state for the game.
         """
-        state = GameState(life=starting_life, dim=self.dim)
-        state.stringified = str(state)
+        state = GameState(life=starting_life, dim=self.dim, positions=self.start)
+        self.sync_state(state)
+        return state
+
+    def state_from_positions(self, positions, life=75, emblems=(), maxs_turn=True, moves_made=0):
+        """ Build a state with the given pieces, for setting up test and
+            benchmark positions.
+            :param positions: {piece: (row, col)}; must include 'T'
+            :param emblems: the lesser titans already defeated
+        """
+        state = GameState(life=life, dim=self.dim, positions=positions)
+        state.emblems = set(emblems)
+        state.maxs_turn = maxs_turn
+        state.moves_made = moves_made
+        self.sync_state(state)
+        return state
+
+    def parse_state(self, text):
+        """ Build a state from the string form of GameState.__str__, for
+            example "T75|M|A:1-0,...,P:0-3,T:7-3|Mvs:0". The emblems are the
+            lesser titans missing from the board.
+        """
+        try:
+            life, side, pieces, moves = text.strip().split("|")
+            positions = {}
+            for item in pieces.split(","):
+                piece, square = item.split(":")
+                r, c = square.split("-")
+                positions[piece] = (int(r), int(c))
+            if not life.startswith("T") or side not in ("M", "E") or not moves.startswith("Mvs:"):
+                raise ValueError
+            # Every piece on its own square of the board; only the Titan Hero
+            # may stand on the Pantheon, once he has captured it.
+            squares = [sq for p, sq in positions.items() if p != 'T' or sq != positions.get('P')]
+            if len(set(squares)) != len(squares) \
+                    or not all(0 <= r < self.dim and 0 <= c < self.dim for r, c in squares):
+                raise ValueError
+            emblems = [p for p in self.lesser_titans if p not in positions]
+            state = self.state_from_positions(positions, int(life[1:]), emblems, side == "M", int(moves[4:]))
+        except (ValueError, KeyError):
+            raise ValueError(f"not a game state: {text!r}")
+        if state.boards['T'] == state.boards.get('P'):
+            # The Titan Hero stands on the Pantheon he captured.
+            state.cachedTerminal, state.cachedOutcome = True, True
+        elif state.life <= 0:
+            state.cachedTerminal, state.cachedOutcome = True, False
         return state
+
+    def sync_state(self, state):
+        """ Recompute the derived fields of a state (Zobrist key and evaluation
+            terms) from its pieces, life and emblems. make_move keeps them up to
+            date afterwards; this is for states built or edited by hand.
+        """
+        state.update_occupancy()
+        state.zobrist = self.zobrist_hash(state)
+        state.lesser_count = state.lesser_occ.bit_count()
+        state.distance_sum = self.distance_sum(state)
+        pantheon = state.boards.get('P')
+        state.pantheon_displacement = self.displacement[pantheon] if pantheon else 0
+
+    def distance_sum(self, state):
+        """ Sum of the Manhattan distances from the Titan Hero to every lesser titan.
+        """
+        row = self.manhattan[state.boards['T']]
+        total = 0
+        occ = state.lesser_occ
+        while occ:
+            bit = occ & -occ
+            total += row[bit]
+            occ ^= bit
+        return total
         
     def is_mins_turn(self, state):
         """ Indicate if it's Min's turn
@@ -121,13 +380,38 @@ class Game(object):
         """
         return depth > self.depth_limit
         
-    def transposition_string(self, state):
-        """ Returns a unique string for the given state.  For use in 
+    def transposition_key(self, state):
+        """ Returns an integer key for the given state.  For use in 
             any Game Tree Search that employs a transposition table.
+            The key covers piece squares, life, emblems and side to move,
+            but not the move count, so transposed move orders share a key.
             :param state: a legal game state
-            :return: a unique string representing the state
+            :return: a 64-bit Zobrist hash of the state
         """
-        return state.stringified
+        return state.zobrist
+
+    def life_key(self, life):
+        """ Zobrist key for a life total. Life is unbounded, so keys are
+            derived from the value and cached rather than pre-generated.
+        """
+        key = self.zobrist_life.get(life)
+        if key is None:
+            key = self.zobrist_life[life] = mix64((life & MASK64) ^ ZOBRIST_SEED)
+        return key
+
+    def zobrist_hash(self, state):
+        """ Compute the Zobrist hash of a state from scratch.
+            Game.result keeps state.zobrist up to date incrementally;
+            this is for freshly built states and for checking.
+        """
+        h = self.life_key(state.life)
+        for p, board in state.boards.items():
+            h ^= self.zobrist_pieces[p][board]
+        for p in state.emblems:
+            h ^= self.zobrist_emblems[p]
+        if not state.maxs_turn:
+            h ^= self.zobrist_side
+        return h
     
     def in_line_of_sight(self, pos1, pos2, state):
         """
@@ -137,27 +421,19 @@ class Game(object):
         Returns True if pos1 and pos2 are in the same row, column, or diagonal and no other
         pieces are in between.
         """
-        r1, c1 = pos1
-        r2, c2 = pos2
-
-        # Check if in the same row, column, or diagonal.
-        if r1 == r2 or c1 == c2 or abs(r1 - r2) == abs(c1 - c2):
-            # Determine step increments.
-            dr = (r2 - r1) // (abs(r2 - r1) if r2 != r1 else 1)
-            dc = (c2 - c1) // (abs(c2 - c1) if c2 != c1 else 1)
-            
-            # Move one step at a time from pos1 towards pos2.
-            r, c = r1 + dr, c1 + dc
-            while (r, c) != (r2, c2):
-                # If any piece is in the way, return False.
-                for piece, pos in state.positions.items():
-                    if pos == (r, c):
-                        return False
-                r += dr
-                c += dc
-            return True
+        between = self.between[square_bit(pos1[0], pos1[1], state.dim)].get(
+            square_bit(pos2[0], pos2[1], state.dim))
+        return between is not None and not between & state.all_occ
 
-        return False
+    def pantheon_sees_titan(self, state):
+        """ True if the Pantheon is on the board and has a clear line of sight
+            to the Titan Hero; the bitboard form of in_line_of_sight.
+        """
+        pantheon = state.boards.get('P')
+        if not pantheon:
+            return False
+        between = self.between[pantheon].get(state.boards['T'])
+        return between is not None and not between & state.all_occ
 
 
     def actions(self, state):
@@ -165,56 +441,52 @@ class Game(object):
             :param state: a state object
             :return: a list of actions legal in the given state
         """
-        moves = []
+        boards = state.boards
         if state.maxs_turn:  # Titan Hero's turn.
-            current_pos = state.positions['T']
-            directions = [(-1, 0), (-1, 1), (0, 1), (1, 1),
-                        (1, 0), (1, -1), (0, -1), (-1, -1)]
-            for dx, dy in directions:
-                for step in range(1, 4):
-                    new_r = current_pos[0] + dx * step
-                    new_c = current_pos[1] + dy * step
-                    # Check boundaries.
-                    if 0 <= new_r < state.dim and 0 <= new_c < state.dim:
-                        # If destination is Pantheon, only allow if all lesser titans are defeated.
-                        dest_piece = None
-                        for p, pos in state.positions.items():
-                            if pos == (new_r, new_c):
-                                dest_piece = p
-                                break
-                        if dest_piece == 'P' and any(p in state.positions for p in ['A','B','C','D','E','F','G','H']):
-                            continue
-                        moves.append(('T', new_r, new_c))
-                    else:
-                        break  # Off-board, no need to check further in this direction.
-        else:
-            # Enemy's turn: For each enemy piece (Lesser Titans and Pantheon)
-            enemy_moves = []
-            for piece in list(state.positions.keys()):
-                if piece in ['A','B','C','D','E','F','G','H','P']:
-                    current_pos = state.positions[piece]
-                    directions = [(-1, 0), (-1, 1), (0, 1), (1, 1),
-                                (1, 0), (1, -1), (0, -1), (-1, -1)]
-                    for dx, dy in directions:
-                        new_r = current_pos[0] + dx
-                        new_c = current_pos[1] + dy
-                        # Check boundaries.
-                        if 0 <= new_r < state.dim and 0 <= new_c < state.dim:
-                            # Check collisions: enemy pieces cannot share a square.
-                            collision = False
-                            for other, pos in state.positions.items():
-                                if other in ['A','B','C','D','E','F','G','H','P'] and pos == (new_r, new_c):
-                                    collision = True
-                                    break
-                            # Pantheon cannot move onto Titan Hero.
-                            if piece == 'P' and state.positions['T'] == (new_r, new_c):
-                                collision = True
-                            if not collision:
-                                enemy_moves.append((piece, new_r, new_c))
-            # Randomize the order of enemy moves so that moves by lesser titans get a chance
-            rand.shuffle(enemy_moves)
-            moves.extend(enemy_moves)
-        return moves
+            # The Pantheon may only be landed on once all lesser titans are defeated.
+            forbidden = boards.get('P', 0) if state.lesser_occ else 0
+            return [move for bit, move in self.titan_moves[boards['T']] if not bit & forbidden]
+
+        # Enemy's turn: For each enemy piece (Lesser Titans and Pantheon)
+        enemy_moves = []
+        for piece in self.enemies:
+            board = boards.get(piece)
+            if not board:
+                continue
+            # Enemy pieces cannot share a square, and the Pantheon cannot move onto Titan Hero.
+            forbidden = state.enemy_occ
+            if piece == 'P':
+                forbidden |= boards['T']
+            enemy_moves.extend(move for bit, move in self.step_moves[piece][board] if not bit & forbidden)
+        # Optionally randomize the order of enemy moves so that moves by lesser titans get a chance
+        if self.shuffle_rng is not None:
+            self.shuffle_rng.shuffle(enemy_moves)
+        return enemy_moves
+
+
+    def capture_damage(self, state, action):
+        """ Return the damage the Titan Hero takes if the action starts combat,
+            or None if it is a quiet move. Capturing the Pantheon costs nothing.
+        """
+        piece, r, c = action
+        bit = square_bit(r, c, state.dim)
+        if piece == 'T':
+            target = state.piece_at(bit & state.enemy_occ)
+            if target is None:
+                return None
+            return 0 if target == 'P' else self.combat_damage(state, target)
+        if piece != 'P' and bit & state.boards['T']:
+            return self.combat_damage(state, piece)
+        return None
+
+
+    def combat_damage(self, state, piece):
+        """ Damage the Titan Hero takes when fighting the given lesser titan,
+            which depends on whether he holds the emblem it is weak to.
+        """
+        if self.weaknesses[piece] in state.emblems:
+            return self.weapon_dam
+        return self.base_dam
 
 
     def result(self, state, action):
@@ -225,81 +497,167 @@ class Game(object):
             :return: a new game state
         """        
         new_state = state.myclone()
-        piece, new_r, new_c = action
+        self.make_move(new_state, action)
+        return new_state
 
-        if new_state.maxs_turn:  # Titan Hero's move.
-            # Move Titan Hero.
-            old_pos = new_state.positions['T']
-            new_state.positions['T'] = (new_r, new_c)
-            
-            # Check if moving onto an enemy.
-            enemy_hit = None
-            for p in ['A','B','C','D','E','F','G','H','P']:
-                if p in new_state.positions and new_state.positions[p] == (new_r, new_c):
-                    enemy_hit = p
-                    break
+
+    def make_move(self, state, action):
+        """ Apply the given action to the state in place.
+            :param state: a legal game state, which is modified
+            :param action: a legal action in the game state
+            :return: an undo record for unmake_move
+        """
+        piece, new_r, new_c = action
+        boards = state.boards
+        dest = square_bit(new_r, new_c, state.dim)
+        keys = self.zobrist_pieces
+        old_life = state.life
+        # Undo record: (piece, from, to, captured piece, life delta, terminal, outcome, zobrist,
+        # distance sum).
+        # The captured piece is also the emblem that was added, unless it is the Pantheon.
+        undo_head = (piece, boards.get(piece, 0), dest)
+        undo_tail = (state.cachedTerminal, state.cachedOutcome, state.zobrist, state.distance_sum)
+        captured = None
+
+        if state.maxs_turn:  # Titan Hero's move.
+            # Check if moving onto an enemy, then move Titan Hero.
+            enemy_hit = state.piece_at(dest & state.enemy_occ)
+            state.all_occ = (state.all_occ ^ boards['T']) | dest
+            state.zobrist ^= keys['T'][boards['T']] ^ keys['T'][dest]
+            boards['T'] = dest
             
             if enemy_hit:
-                if enemy_hit in ['A','B','C','D','E','F','G','H']:
+                captured = enemy_hit
+                if enemy_hit != 'P':
                     # Combat: Determine damage based on emblem effectiveness.
-                    required_emblem = self.weaknesses[enemy_hit]
-                    if required_emblem in new_state.emblems:
-                        damage = 3
-                    else:
-                        damage = 8
-                    new_state.life -= damage
+                    state.life -= self.combat_damage(state, enemy_hit)
                     # Collect the emblem.
-                    new_state.emblems.add(enemy_hit)
+                    state.emblems.add(enemy_hit)
                     # Remove the enemy piece.
-                    del new_state.positions[enemy_hit]
-                elif enemy_hit == 'P':
+                    del boards[enemy_hit]
+                    del state.enemy_at[dest]
+                    state.lesser_occ ^= dest
+                    state.enemy_occ ^= dest
+                    state.lesser_count -= 1
+                    state.zobrist ^= keys[enemy_hit][dest] ^ self.zobrist_emblems[enemy_hit]
+                state.distance_sum = self.distance_sum(state)
+                if enemy_hit == 'P':
                     # If Pantheon is captured legally, Titan Hero wins.
-                    new_state.cachedTerminal = True
-                    new_state.cachedOutcome = True
-                    new_state.stringified = str(new_state)
-                    return new_state
+                    state.cachedTerminal = True
+                    state.cachedOutcome = True
+                    return undo_head + ('P', 0) + undo_tail
             else:
+                state.distance_sum = self.distance_sum(state)
                 # No combat: apply end-of-turn energy drain.
-                new_state.life -= self.perturn_dam
+                state.life -= self.perturn_dam
 
             # Switch turn.
-            new_state.maxs_turn = False
+            state.maxs_turn = False
 
         else:  # Enemy's turn.
             # Move the enemy piece.
-            if piece in new_state.positions:  # It should be present.
-                new_state.positions[piece] = (new_r, new_c)
+            if piece in boards:  # It should be present.
+                src = boards[piece]
+                moved = src | dest
+                if piece != 'P':
+                    state.lesser_occ ^= moved
+                    distances = self.manhattan[boards['T']]
+                    state.distance_sum += distances[dest] - distances[src]
+                else:
+                    state.pantheon_displacement = self.displacement[dest]
+                state.enemy_occ ^= moved
+                state.all_occ ^= moved
+                state.zobrist ^= keys[piece][src] ^ keys[piece][dest]
+                boards[piece] = dest
+                del state.enemy_at[src]
                 
                 # Check for combat if a Lesser Titan moves onto Titan Hero.
-                if piece in ['A','B','C','D','E','F','G','H'] and new_state.positions['T'] == (new_r, new_c):
-                    required_emblem = self.weaknesses[piece]
-                    if required_emblem in new_state.emblems:
-                        damage = 3
-                    else:
-                        damage = 8
-                    new_state.life -= damage
+                if piece != 'P' and dest & boards['T']:
+                    captured = piece
+                    state.life -= self.combat_damage(state, piece)
                     # Collect emblem and remove enemy.
-                    new_state.emblems.add(piece)
-                    del new_state.positions[piece]
+                    state.emblems.add(piece)
+                    del boards[piece]
+                    state.lesser_occ ^= dest
+                    state.enemy_occ ^= dest
+                    state.all_occ |= dest
+                    state.lesser_count -= 1
+                    state.zobrist ^= keys[piece][dest] ^ self.zobrist_emblems[piece]
+                else:
+                    state.enemy_at[dest] = piece
             
             # Pantheon's Divine Smite: Check if Pantheon sees Titan Hero.
-            pantheon_pos = new_state.positions.get('P', None)
-            hero_pos = new_state.positions['T']
-            if pantheon_pos and self.in_line_of_sight(pantheon_pos, hero_pos, new_state):
-                new_state.life -= self.shot_dam
+            if self.pantheon_sees_titan(state):
+                state.life -= self.shot_dam
 
             # Switch turn.
-            new_state.maxs_turn = True
+            state.maxs_turn = True
 
-        new_state.moves_made += 1
+        state.moves_made += 1
+        state.zobrist ^= self.zobrist_side
+        if state.life != old_life:
+            state.zobrist ^= self.life_key(old_life) ^ self.life_key(state.life)
 
         # Terminal check: if Titan Hero's life drops to 0 or below.
-        if new_state.life <= 0:
-            new_state.cachedTerminal = True
-            new_state.cachedOutcome = False
+        if state.life <= 0:
+            state.cachedTerminal = True
+            state.cachedOutcome = False
 
-        new_state.stringified = str(new_state)
-        return new_state
+        return undo_head + (captured, old_life - state.life) + undo_tail
+
+
+    def unmake_move(self, state, undo):
+        """ Take back a move applied with make_move, restoring the state exactly.
+            :param state: the state the move was applied to
+            :param undo: the record returned by make_move
+        """
+        piece, src, dest, captured, life_lost, terminal, outcome, zobrist, distance_sum = undo
+        boards = state.boards
+        state.cachedTerminal = terminal
+        state.cachedOutcome = outcome
+        state.zobrist = zobrist
+        state.distance_sum = distance_sum
+
+        if captured == 'P':
+            # The winning move left the turn and move count untouched.
+            boards['T'] = src
+            state.all_occ |= src
+            return
+
+        state.life += life_lost
+        state.moves_made -= 1
+        state.maxs_turn = not state.maxs_turn
+
+        if piece == 'T':
+            boards['T'] = src
+            if captured:
+                boards[captured] = dest
+                state.enemy_at[dest] = captured
+                state.emblems.discard(captured)
+                state.lesser_occ |= dest
+                state.enemy_occ |= dest
+                state.all_occ |= src
+                state.lesser_count += 1
+            else:
+                state.all_occ ^= src | dest
+        elif src:
+            boards[piece] = src
+            state.enemy_at[src] = piece
+            if captured:
+                state.emblems.discard(captured)
+                state.lesser_occ |= src
+                state.enemy_occ |= src
+                state.all_occ |= src
+                state.lesser_count += 1
+            else:
+                del state.enemy_at[dest]
+                moved = src | dest
+                if piece != 'P':
+                    state.lesser_occ ^= moved
+                else:
+                    state.pantheon_displacement = self.displacement[src]
+                state.enemy_occ ^= moved
+                state.all_occ ^= moved
 
 
     def utility(self, state):
@@ -323,6 +681,8 @@ class Game(object):
     def eval(self, state):
         """
         A refined evaluation function that differentiates enemy piece types.
+        The distance sum, lesser titan count and Pantheon displacement are
+        kept on the state by make_move, so a leaf costs a few lookups.
         
         Factors considered:
         - Titan Hero's remaining life.
@@ -340,26 +700,14 @@ class Game(object):
         EMBLEM_WEIGHT = 5.0              # bonus per collected emblem
         BONUS_CAPTURE_PANTHEON = 50.0    # bonus when only Pantheon remains and is close
         DIVINE_SMITE_PENALTY = 15.0      # penalty if Pantheon can shoot Titan Hero
-        # NEW: Extra penalty parameters for Pantheon’s position
-        IDEAL_PANTHEON = (0, 3)
+        # NEW: Extra penalty for Pantheon’s position (ideal square is self.ideal_pantheon)
         PANTHEON_MOVE_PENALTY = 40.0     # penalty multiplier per unit distance from ideal
 
-        hero_pos = state.positions['T']
-        total_enemy_count = 0
-        total_distance = 0
-        pantheon_distance = None
-
-        lesser_count = 0
-        for p, pos in state.positions.items():
-            if p in ['A','B','C','D','E','F','G','H']:
-                total_enemy_count += 1
-                lesser_count += 1
-                total_distance += abs(hero_pos[0] - pos[0]) + abs(hero_pos[1] - pos[1])
-            elif p == 'P':
-                total_enemy_count += 1
-                pantheon_distance = abs(hero_pos[0] - pos[0]) + abs(hero_pos[1] - pos[1])
+        pantheon = state.boards.get('P')
+        lesser_count = state.lesser_count
+        total_enemy_count = lesser_count + 1 if pantheon else lesser_count
 
-        avg_distance = (total_distance / lesser_count) if lesser_count > 0 else 0
+        avg_distance = (state.distance_sum / lesser_count) if lesser_count > 0 else 0
 
         # Start with Titan Hero's life.
         score = LIFE_WEIGHT * state.life
@@ -370,20 +718,19 @@ class Game(object):
         # Bonus for collected emblems.
         score += EMBLEM_WEIGHT * len(state.emblems)
 
-        # If only Pantheon remains, reward states where it's close.
-        if total_enemy_count == 1 and 'P' in state.positions and pantheon_distance is not None:
-            score += BONUS_CAPTURE_PANTHEON / (pantheon_distance + 1)
+        if pantheon:
+            # If only Pantheon remains, reward states where it's close.
+            if lesser_count == 0:
+                pantheon_distance = self.manhattan[state.boards['T']][pantheon]
+                score += BONUS_CAPTURE_PANTHEON / (pantheon_distance + 1)
 
-        # Penalty if Pantheon can shoot Titan Hero.
-        if 'P' in state.positions and self.in_line_of_sight(state.positions['P'], hero_pos, state):
-            score -= DIVINE_SMITE_PENALTY
+            # Penalty if Pantheon can shoot Titan Hero.
+            if self.pantheon_sees_titan(state):
+                score -= DIVINE_SMITE_PENALTY
 
-        # NEW: Extra penalty if Pantheon is not at its ideal position.
-        if 'P' in state.positions:
-            current_pantheon = state.positions['P']
-            distance_from_ideal = abs(current_pantheon[0] - IDEAL_PANTHEON[0]) + abs(current_pantheon[1] - IDEAL_PANTHEON[1])
+            # NEW: Extra penalty if Pantheon is not at its ideal position.
             # The farther P is from the ideal position, the higher the penalty.
-            score -= PANTHEON_MOVE_PENALTY * distance_from_ideal
+            score -= PANTHEON_MOVE_PENALTY * state.pantheon_displacement
 
         return score
 
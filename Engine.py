@@ -0,0 +1,226 @@
+"""
+Long-running engine speaking a UCI-like line protocol on stdin/stdout.
+
+Commands:
+    uci                              identify; answered with uciok
+    isready                          answered with readyok
+    setoption name <N> value <V>     Hash (MB), Depth, Reductions, Futility,
+                                     Extensions, Tablebase (file path), MultiPV
+    newgame                          start a new game; the table stays warm
+    position startpos [life <n>] [moves <m> ...]
+    position state <state> [moves <m> ...]
+    go [depth <n>] [movetime <ms>] [nodes <n>] [infinite]
+    stop                             end the running search now; other
+                                     commands wait for it to finish
+    d                                print the current position
+    quit
+
+States are written as GameState.__str__ writes them and moves as
+piece:row-col, for example T:4-3. While a search runs, an info line is
+printed for every completed depth, then bestmove with the expected reply.
+With MultiPV above 1, bestmove is preceded by one "info ... multipv <k>"
+line for each of the best moves, best first.
+"""
+import sys
+import threading
+
+import AlphaBeta
+import Chess
+from Transposition import TranspositionTable
+
+NAME = "Titan's Challenge engine"
+
+
+def format_move(move):
+    piece, r, c = move
+    return f"{piece}:{r}-{c}"
+
+
+def parse_move(text):
+    try:
+        piece, square = text.split(":")
+        r, c = square.split("-")
+        return piece, int(r), int(c)
+    except ValueError:
+        raise ValueError(f"not a move: {text!r}")
+
+
+class Engine:
+    """
+    The engine's state between commands: one game, one searcher with its
+    transposition table, the current position and the running search.
+    """
+    DEFAULT_DEPTH = 4
+    DEFAULT_HASH_MB = 64
+
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self._lock = threading.Lock()
+        self.game = Chess.Game(depthlimit=self.DEFAULT_DEPTH)
+        self.searcher = AlphaBeta.MiniMax(self.game, TranspositionTable.for_memory(self.DEFAULT_HASH_MB))
+        self.searcher.on_iteration = self._info
+        self.state = self.game.initial_state()
+        self._thread = None
+
+    def send(self, line):
+        with self._lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def run(self, lines):
+        """ Process commands until quit or the end of input. At the end of
+            input a running search is allowed to finish.
+        """
+        for line in lines:
+            words = line.split()
+            if not words:
+                continue
+            if words[0] == "quit":
+                self.stop()
+                return
+            try:
+                self.command(words)
+            except ValueError as e:
+                self.send(f"info string error {e}")
+        self.wait()
+
+    def command(self, words):
+        name, args = words[0], words[1:]
+        if name == "uci":
+            self.send(f"id name {NAME}")
+            for option in ("Hash", "Depth", "Reductions", "Futility", "Extensions", "Tablebase", "MultiPV"):
+                self.send(f"option name {option}")
+            self.send("uciok")
+        elif name == "isready":
+            self.send("readyok")
+        elif name == "stop":
+            self.stop()
+        elif name == "d":
+            self.send(f"info string {self.state}")
+        else:
+            # Everything else changes the engine, so wait for a running search.
+            self.wait()
+            if name == "setoption":
+                self.set_option(args)
+            elif name == "newgame":
+                self.state = self.game.initial_state()
+            elif name == "position":
+                self.set_position(args)
+            elif name == "go":
+                self.go(args)
+            else:
+                raise ValueError(f"unknown command {name}")
+
+    def set_option(self, args):
+        if len(args) < 4 or args[0] != "name" or "value" not in args:
+            raise ValueError("usage: setoption name <name> value <value>")
+        split = args.index("value")
+        option, value = " ".join(args[1:split]).lower(), " ".join(args[split + 1:])
+        if option == "hash":
+            self.searcher.transposition_table = TranspositionTable.for_memory(float(value))
+        elif option == "depth":
+            self.game.depth_limit = int(value)
+        elif option in ("reductions", "futility", "extensions"):
+            setattr(self.searcher, option, value.lower() in ("true", "on", "1"))
+        elif option == "multipv":
+            if int(value) < 1:
+                raise ValueError("MultiPV must be at least 1")
+            self.searcher.multipv = int(value)
+        elif option == "tablebase":
+            from Tablebase import EndgameTable
+            try:
+                table = EndgameTable(value) if value else None
+            except OSError as e:
+                raise ValueError(f"cannot open {value}: {e.strerror}")
+            if table is not None and table.dim != self.game.dim:
+                table.close()
+                raise ValueError(f"{value} is a table for a {table.dim}x{table.dim} board")
+            self.searcher.tablebase = table
+        else:
+            raise ValueError(f"unknown option {option}")
+
+    def set_position(self, args):
+        if args[:1] == ["startpos"]:
+            rest = args[1:]
+            life = 75
+            if rest[:1] == ["life"]:
+                if len(rest) < 2:
+                    raise ValueError("usage: position startpos life <n> [moves ...]")
+                life, rest = int(rest[1]), rest[2:]
+            state = self.game.initial_state(starting_life=life)
+        elif args[:1] == ["state"] and len(args) > 1:
+            state, rest = self.game.parse_state(args[1]), args[2:]
+        else:
+            raise ValueError("usage: position startpos [life <n>] | state <state> [moves ...]")
+        if rest:
+            if rest[0] != "moves":
+                raise ValueError(f"unexpected {rest[0]}")
+            for text in rest[1:]:
+                move = parse_move(text)
+                if self.game.is_terminal(state) or move not in self.game.actions(state):
+                    raise ValueError(f"illegal move {text}")
+                state = self.game.result(state, move)
+        self.state = state
+
+    def go(self, args):
+        limits = {"depth": None, "movetime": None, "nodes": None}
+        infinite = False
+        i = 0
+        while i < len(args):
+            if args[i] == "infinite":
+                infinite = True
+                i += 1
+            elif args[i] in limits and i + 1 < len(args):
+                limits[args[i]] = int(args[i + 1])
+                i += 2
+            else:
+                raise ValueError(f"unexpected {args[i]}")
+        if self.game.is_terminal(self.state):
+            raise ValueError("the game is over")
+        time_limit = limits["movetime"] / 1000 if limits["movetime"] is not None else None
+        max_depth = limits["depth"]
+        if infinite and max_depth is None:
+            max_depth = self.searcher.MAX_DEPTH
+        self.searcher.stopped = False
+        self._thread = threading.Thread(target=self._search,
+                                        args=(self.state, time_limit, limits["nodes"], max_depth), daemon=True)
+        self._thread.start()
+
+    def _search(self, state, time_limit, node_limit, max_depth):
+        res = self.searcher.choose_move(state, time_limit, node_limit, max_depth)
+        if self.searcher.multipv > 1:
+            for k, (value, pv) in enumerate(res.lines, 1):
+                self.send(f"info depth {res.depth} multipv {k} score {value:g} "
+                          f"pv {' '.join(format_move(m) for m in pv)}")
+        line = f"bestmove {format_move(res.move)}"
+        if len(res.pv) > 1:
+            line += f" ponder {format_move(res.pv[1])}"
+        self.send(line)
+
+    def _info(self, depth, value, nodes, elapsed, pv):
+        nps = int(nodes / elapsed) if elapsed > 0 else 0
+        self.send(f"info depth {depth} score {value:g} nodes {nodes} nps {nps} "
+                  f"time {int(elapsed * 1000)} pv {' '.join(format_move(m) for m in pv)}")
+
+    def stop(self):
+        """ Stop the running search, if any, and wait for its bestmove.
+        """
+        if self._thread is not None:
+            self.searcher.stop()
+            self.wait()
+            self.searcher.stopped = False
+
+    def wait(self):
+        """ Wait for the running search, if any, to finish.
+        """
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def main():
+    Engine().run(sys.stdin)
+
+
+if __name__ == "__main__":
+    main()
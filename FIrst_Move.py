@@ -10,5 +10,5 @@ for depth in depth_list:
     game = Game.Game(depthlimit=depth)
     state = game.initial_state()
 
-    current_player = p.VerboseComputer(game, ab.Minimax(game))
-    current_player.ask_move(state)
\ No newline at end of file
+    current_player = p.VerboseComp(game, ab.MiniMax(game))
+    current_player.ask_move(state)
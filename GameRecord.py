@@ -0,0 +1,203 @@
+"""
+Compact binary game records.
+
+In the standard game a state packs into 16 bytes and a move into 2, so
+millions of positions fit in a small file. A record file is a header and then
+one record per game, appended as each game ends:
+
+    file header   magic, board size, number of lesser titans
+    game header   number of moves, outcome (1 Titan Hero, -1 Legion, 0 unfinished)
+    start state
+    moves         one move per ply
+
+Readers are generators that read one game at a time, so a file of any size
+is streamed in constant memory.
+"""
+import argparse
+import os
+import struct
+import sys
+
+import Chess
+
+MAGIC = b"TITANGR1"
+# magic, board size, number of lesser titans
+FILE_HEADER = struct.Struct("<8sBB")
+# number of moves, outcome
+GAME_HEADER = struct.Struct("<Hb")
+
+MAXS_TURN, TERMINAL, TITAN_WON = 1, 2, 4
+
+
+class RecordFormat:
+    """
+    The fixed-width encodings of states and moves for one board size and
+    army. Squares take a byte on boards of up to 15x15 and two bytes beyond;
+    the emblem bitmask takes as many bytes as the army needs. For the
+    standard game a state is 16 bytes and a move 2:
+
+        STATE   square of every piece, Titan Hero and Pantheon first
+                (all bits set once removed), life, emblem bitmask, flags,
+                moves made
+        MOVE    piece index, square
+    """
+
+    def __init__(self, game):
+        self.game = game
+        self.dim = game.dim
+        self.pieces = ('T', 'P') + game.lesser_titans
+        self.piece_index = {p: i for i, p in enumerate(self.pieces)}
+        self.emblem_bits = {p: 1 << i for i, p in enumerate(game.lesser_titans)}
+        square = "B" if game.dim * game.dim < 0xFF else "H"
+        self.no_square = 0xFF if square == "B" else 0xFFFF
+        emblems = "B" if len(game.lesser_titans) <= 8 else "H" if len(game.lesser_titans) <= 16 else "I"
+        self.state = struct.Struct(f"<{len(self.pieces)}{square}h{emblems}BH")
+        self.move = struct.Struct(f"<B{square}")
+
+    def encode_state(self, state):
+        """ Pack a state into self.state.size bytes.
+        """
+        boards = state.boards
+        squares = [boards[p].bit_length() - 1 if p in boards else self.no_square for p in self.pieces]
+        emblems = 0
+        for p in state.emblems:
+            emblems |= self.emblem_bits[p]
+        flags = (MAXS_TURN if state.maxs_turn else 0) | (TERMINAL if state.cachedTerminal else 0) \
+            | (TITAN_WON if state.cachedOutcome else 0)
+        return self.state.pack(*squares, state.life, emblems, flags, state.moves_made)
+
+    def decode_state(self, data, offset=0):
+        """ Unpack a state written by encode_state.
+        """
+        *squares, life, emblems, flags, moves_made = self.state.unpack_from(data, offset)
+        positions = {p: divmod(sq, self.dim) for p, sq in zip(self.pieces, squares) if sq != self.no_square}
+        state = self.game.state_from_positions(positions, life,
+                                               [p for p, bit in self.emblem_bits.items() if emblems & bit],
+                                               bool(flags & MAXS_TURN), moves_made)
+        if flags & TERMINAL:
+            state.cachedTerminal = True
+            state.cachedOutcome = bool(flags & TITAN_WON)
+        return state
+
+    def encode_move(self, move):
+        piece, r, c = move
+        return self.move.pack(self.piece_index[piece], r * self.dim + c)
+
+    def decode_move(self, data, offset=0):
+        piece, square = self.move.unpack_from(data, offset)
+        return (self.pieces[piece],) + divmod(square, self.dim)
+
+
+def outcome_code(state):
+    if not state.cachedTerminal:
+        return 0
+    return 1 if state.cachedOutcome else -1
+
+
+class RecordWriter:
+    """
+    Appends games to a record file, creating it with its header if needed.
+    Each game is written with a single write and flushed, so a reader never
+    sees half a game unless the writer dies during that write.
+    """
+
+    def __init__(self, path, game=None):
+        game = game or Chess.Game()
+        self.path = path
+        self.format = RecordFormat(game)
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(FILE_HEADER.pack(MAGIC, game.dim, len(game.lesser_titans)))
+            self._file.flush()
+        elif read_header(path) != (game.dim, len(game.lesser_titans)):
+            self._file.close()
+            raise ValueError(f"{path} holds games of another board size or army")
+
+    def write_game(self, start, moves, outcome=0):
+        """ Append a game given its start state, its moves and its outcome code.
+        """
+        fmt = self.format
+        data = [GAME_HEADER.pack(len(moves), outcome), fmt.encode_state(start)]
+        data.extend(fmt.encode_move(move) for move in moves)
+        self._file.write(b"".join(data))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_header(path):
+    """ Check a record file's header and return its board size and number of
+        lesser titans.
+    """
+    with open(path, "rb") as f:
+        header = f.read(FILE_HEADER.size)
+    if len(header) < FILE_HEADER.size or header[:8] != MAGIC:
+        raise ValueError(f"{path} is not a game record file")
+    return FILE_HEADER.unpack(header)[1:]
+
+
+def read_games(path, game=None):
+    """ Stream the games of a record file as (start state, moves, outcome code).
+        :param game: Game to build the states with; by default one for the
+                     file's board size and army
+    """
+    dim, titans = read_header(path)
+    fmt = RecordFormat(game or Chess.Game(dim, titans=titans))
+    state_size, move_size = fmt.state.size, fmt.move.size
+    with open(path, "rb") as f:
+        f.seek(FILE_HEADER.size)
+        while True:
+            header = f.read(GAME_HEADER.size + state_size)
+            if len(header) < GAME_HEADER.size + state_size:
+                return
+            count, outcome = GAME_HEADER.unpack_from(header)
+            moves = f.read(count * move_size)
+            if len(moves) < count * move_size:
+                return
+            start = fmt.decode_state(header, GAME_HEADER.size)
+            yield start, [fmt.decode_move(moves, i * move_size) for i in range(count)], outcome
+
+
+def replay(path, game=None):
+    """ Stream every position of every game in a record file as
+        (game number, state, move played), playing the moves with Game.result;
+        each game ends with its final state and move None.
+    """
+    dim, titans = read_header(path)
+    game = game or Chess.Game(dim, titans=titans)
+    for number, (state, moves, _) in enumerate(read_games(path, game)):
+        for move in moves:
+            yield number, state, move
+            state = game.result(state, move)
+        yield number, state, None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize or print a game record file.")
+    parser.add_argument("path")
+    parser.add_argument("--print", action="store_true", help="print every position as it is replayed")
+    args = parser.parse_args(argv)
+
+    games = positions = titan_wins = unfinished = 0
+    for number, state, move in replay(args.path):
+        positions += 1
+        if args.print:
+            print(number, state, "" if move is None else f"{move[0]}:{move[1]}-{move[2]}")
+        if move is None:
+            games += 1
+            titan_wins += state.cachedTerminal and state.cachedOutcome
+            unfinished += not state.cachedTerminal
+    size = os.path.getsize(args.path)
+    print(f"{args.path}: {games} games, {positions} positions, {titan_wins} Titan Hero wins, "
+          f"{unfinished} unfinished, {size} bytes", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""
+Game server: many Titan's Challenge games at once over TCP or a Unix socket.
+
+Each connection is one session with its own game state. Moves are checked
+with Game.actions and the engine's replies are searched on a bounded pool
+of worker processes, so a slow search only holds up its own session. The
+protocol is one command per line, with moves and states written as in
+Engine.py:
+
+    new [T|L] [life <n>] [depth <n>] [movetime <ms>]
+                        start a game playing the given side (default T);
+                        answered with ok and the state, then the engine's
+                        move if it moves first
+    move <piece:row-col>
+                        play a move; answered with ok, then the engine's
+                        reply as "engine <move> value <v> depth <d> nodes <n>
+                        queue <ms> search <ms>"
+    go                  ask the engine to move, after a busy answer
+    moves               list the legal moves
+    state               print the state
+    stats               server-wide sessions, queue and latencies as JSON
+    quit
+
+When the game ends, "over Titan" or "over Legion" follows. Errors are
+answered with "error <reason>"; "error busy" means the engine queue is full
+and the move stands, so the client retries with go.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import Chess
+from AlphaBeta import MiniMax, current_time
+from Engine import format_move, parse_move
+from Transposition import TranspositionTable
+
+# Per-process searcher of a pool worker, set up by _init_worker.
+_worker = {}
+
+
+def _init_worker(game, table_capacity, tablebase):
+    _worker["searcher"] = MiniMax(game, TranspositionTable(table_capacity), tablebase=tablebase)
+
+
+def _engine_move(state, time_limit, max_depth):
+    """ Pool task: search a state and return (move, value, depth, nodes).
+        Each worker's table is kept warm across requests from every session.
+    """
+    res = _worker["searcher"].choose_move(state, time_limit, None, max_depth)
+    return res.move, res.value, res.depth, res.nodes
+
+
+class Busy(Exception):
+    """ Raised when the engine queue is full. """
+
+
+class LatencyStats:
+    """
+    The latest samples of a few named latencies, in seconds, summarised as
+    count, mean, median, 95th percentile and maximum in milliseconds.
+    """
+    def __init__(self, keep=1000):
+        self.samples = collections.defaultdict(lambda: collections.deque(maxlen=keep))
+        self.counts = collections.Counter()
+
+    def record(self, name, seconds):
+        self.samples[name].append(seconds)
+        self.counts[name] += 1
+
+    def summary(self):
+        result = {}
+        for name, samples in self.samples.items():
+            ordered = sorted(samples)
+            n = len(ordered)
+            result[name] = {"count": self.counts[name],
+                            "mean_ms": 1000 * sum(ordered) / n,
+                            "p50_ms": 1000 * ordered[n // 2],
+                            "p95_ms": 1000 * ordered[min(n - 1, int(n * 0.95))],
+                            "max_ms": 1000 * ordered[-1]}
+        return result
+
+
+class EnginePool:
+    """
+    Engine searches on a pool of worker processes.
+
+    At most one search per worker is handed to the pool, so a search starts
+    as soon as it is submitted and its time limit is all search time; the
+    rest wait here in order. Once max_pending searches are running or
+    waiting, further requests are refused with Busy instead of queueing
+    without bound. A search is given its time limit plus a grace period; if
+    it still has not answered, the request fails, but the worker stays
+    counted as busy until its search really ends.
+    """
+    GRACE = 1.0
+
+    def __init__(self, game, workers=2, max_pending=16, table_capacity=1 << 17, tablebase=None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.latency = LatencyStats()
+        self._slots = asyncio.Semaphore(workers)
+        self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                         initargs=(game, table_capacity, tablebase))
+
+    def close(self):
+        self._pool.shutdown(cancel_futures=True)
+
+    async def search(self, state, time_limit, max_depth):
+        """ Search a state on the pool.
+            :return: (move, value, depth, nodes, queue seconds, search seconds)
+        """
+        if self.pending >= self.max_pending:
+            raise Busy()
+        self.pending += 1
+        queued = current_time()
+        try:
+            await self._slots.acquire()
+            started = current_time()
+            future = asyncio.get_running_loop().run_in_executor(self._pool, _engine_move,
+                                                                state, time_limit, max_depth)
+            future.add_done_callback(lambda _: self._slots.release())
+            timeout = None if time_limit is None else time_limit + self.GRACE
+            move, value, depth, nodes = await asyncio.wait_for(asyncio.shield(future), timeout)
+        finally:
+            self.pending -= 1
+        finished = current_time()
+        self.latency.record("queue", started - queued)
+        self.latency.record("search", finished - started)
+        return move, value, depth, nodes, started - queued, finished - started
+
+
+class Session:
+    """
+    One connection's game: the state, the side the client plays and the
+    engine's search limits.
+    """
+    def __init__(self, server, reader, writer):
+        self.server = server
+        self.game = server.game
+        self.reader = reader
+        self.writer = writer
+        self.state = None
+        self.side = "T"
+        self.time_limit = server.default_time
+        self.max_depth = server.default_depth
+
+    async def send(self, line):
+        self.writer.write((line + "\n").encode())
+        # Wait for slow readers instead of buffering their replies without bound.
+        await self.writer.drain()
+
+    async def run(self):
+        while True:
+            try:
+                line = await self.reader.readline()
+            except ValueError:
+                await self.send("error line too long")
+                return
+            if not line:
+                return
+            words = line.decode(errors="replace").split()
+            if not words:
+                continue
+            if words[0] == "quit":
+                return
+            start = current_time()
+            try:
+                await self.command(words)
+            except ValueError as e:
+                await self.send(f"error {e}")
+            self.server.latency.record("request", current_time() - start)
+
+    async def command(self, words):
+        name, args = words[0], words[1:]
+        if name == "stats":
+            await self.send("stats " + json.dumps(self.server.stats()))
+            return
+        if name == "new":
+            await self.new_game(args)
+            return
+        if self.state is None:
+            raise ValueError("no game; start one with new")
+        if name == "state":
+            await self.send(f"state {self.state}")
+        elif name == "moves":
+            await self.send("moves " + " ".join(format_move(m) for m in self.game.actions(self.state)))
+        elif name == "move":
+            if len(args) != 1:
+                raise ValueError("usage: move <piece:row-col>")
+            if self.game.is_terminal(self.state) or not self.clients_turn():
+                raise ValueError("not your turn")
+            move = parse_move(args[0])
+            if move not in self.game.actions(self.state):
+                raise ValueError(f"illegal move {args[0]}")
+            self.state = self.game.result(self.state, move)
+            await self.send(f"ok {self.state}")
+            await self.engine_moves()
+        elif name == "go":
+            await self.engine_moves()
+        else:
+            raise ValueError(f"unknown command {name}")
+
+    async def new_game(self, args):
+        side, life = "T", 75
+        time_limit, max_depth = self.server.default_time, self.server.default_depth
+        if args[:1] in (["T"], ["L"]):
+            side, args = args[0], args[1:]
+        if len(args) % 2:
+            raise ValueError("usage: new [T|L] [life <n>] [depth <n>] [movetime <ms>]")
+        for key, value in zip(args[::2], args[1::2]):
+            if key == "life":
+                life = int(value)
+            elif key == "depth":
+                max_depth = min(int(value), self.server.max_depth)
+            elif key == "movetime":
+                time_limit = min(int(value) / 1000, self.server.max_time)
+            else:
+                raise ValueError(f"unexpected {key}")
+        if life < 1 or max_depth < 1 or time_limit <= 0:
+            raise ValueError("life, depth and movetime must be positive")
+        self.side, self.time_limit, self.max_depth = side, time_limit, max_depth
+        self.state = self.game.initial_state(starting_life=life)
+        self.server.games_started += 1
+        await self.send(f"ok {self.state}")
+        await self.engine_moves()
+
+    def clients_turn(self):
+        return self.state.maxs_turn == (self.side == "T")
+
+    async def engine_moves(self):
+        """ Play the engine's moves until it is the client's turn or the game ends.
+        """
+        while not self.game.is_terminal(self.state) and not self.clients_turn():
+            try:
+                move, value, depth, nodes, queued, searched = await self.server.engine.search(
+                    self.state, self.time_limit, self.max_depth)
+            except Busy:
+                raise ValueError("busy")
+            except asyncio.TimeoutError:
+                raise ValueError("engine timed out")
+            self.state = self.game.result(self.state, move)
+            await self.send(f"engine {format_move(move)} value {value:g} depth {depth} nodes {nodes} "
+                            f"queue {queued * 1000:.0f} search {searched * 1000:.0f}")
+        if self.game.is_terminal(self.state):
+            await self.send("over " + ("Titan" if self.state.cachedOutcome else "Legion"))
+
+
+class GameServer:
+    """
+    Accepts connections and runs a Session for each, all sharing one Game for
+    move checking and one EnginePool for searching.
+    """
+    MAX_LINE = 4096
+
+    def __init__(self, workers=2, max_pending=16, default_depth=4, default_time=2.0,
+                 max_depth=8, max_time=10.0, table_capacity=1 << 17, tablebase=None):
+        self.game = Chess.Game(depthlimit=default_depth)
+        self.default_depth = default_depth
+        self.default_time = default_time
+        self.max_depth = max_depth
+        self.max_time = max_time
+        self.engine = EnginePool(self.game, workers, max_pending, table_capacity, tablebase)
+        self.latency = self.engine.latency
+        self.sessions = 0
+        self.games_started = 0
+
+    async def handle(self, reader, writer):
+        self.sessions += 1
+        try:
+            await Session(self, reader, writer).run()
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+
+    def stats(self):
+        return {"sessions": self.sessions, "games_started": self.games_started, "workers": self.engine.workers,
+                "pending": self.engine.pending, "max_pending": self.engine.max_pending,
+                "latency": self.latency.summary()}
+
+    async def serve(self, host="127.0.0.1", port=7777, unix_path=None):
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle, unix_path, limit=self.MAX_LINE)
+        else:
+            server = await asyncio.start_server(self.handle, host, port, limit=self.MAX_LINE)
+        where = unix_path or f"{host}:{server.sockets[0].getsockname()[1]}"
+        print(f"listening on {where}", file=sys.stderr)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.engine.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve Titan's Challenge games over TCP or a Unix socket.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead")
+    parser.add_argument("--workers", type=int, default=2, help="engine processes")
+    parser.add_argument("--max-pending", type=int, default=16,
+                        help="engine requests running or waiting before clients are told busy")
+    parser.add_argument("--depth", type=int, default=4, help="default engine depth limit")
+    parser.add_argument("--movetime", type=int, default=2000, help="default engine time per move, ms")
+    parser.add_argument("--max-depth", type=int, default=8, help="deepest depth a client may ask for")
+    parser.add_argument("--max-movetime", type=int, default=10000, help="longest time a client may ask for, ms")
+    parser.add_argument("--tablebase", help="endgame table file for the engine")
+    args = parser.parse_args(argv)
+
+    tablebase = None
+    if args.tablebase:
+        from Tablebase import EndgameTable
+        tablebase = EndgameTable(args.tablebase)
+    server = GameServer(args.workers, args.max_pending, args.depth, args.movetime / 1000,
+                        args.max_depth, args.max_movetime / 1000, tablebase=tablebase)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,15 @@ import AlphaBeta as Computer
 import Chess as Game
 
 if len(sys.argv) <= 2:
-    print("Usage: python human_vs_machine.py <side> <search>")
+    print("Usage: python human_vs_machine.py <side> <search> [ponder]")
     print("Side T is for player to play Titan Hero , L is for player to play the Legion")
     print("Choosing a higher depth limit should make the computer player stronger")
+    print("With ponder, the computer keeps searching while you think")
     exit()
 
 side = sys.argv[1]
 depth_lim = int(sys.argv[2])
+ponder = len(sys.argv) > 3 and sys.argv[3] == "ponder"
 
 #Create game and initial state
 game1 =Game.Game(depthlimit=depth_lim)
@@ -20,10 +22,18 @@ state2 = game2.initial_state()
 
 if side == "T":
     current_player = Players.HumanInterface(game1)
-    other_player = Players.ComputerInt(game2, Computer.MiniMax(game2))
+    if ponder:
+        other_player = Players.PonderingComp(game2, Computer.MiniMax(game2))
+    else:
+        other_player = Players.ComputerInt(game2, Computer.MiniMax(game2))
+    computer = other_player
 else:
-    current_player = Players.VerboseComp(game1, Computer.MiniMax(game1))
+    if ponder:
+        current_player = Players.PonderingComp(game1, Computer.MiniMax(game1))
+    else:
+        current_player = Players.VerboseComp(game1, Computer.MiniMax(game1))
     other_player = Players.HumanInterface(game2)
+    computer = current_player
 
 current_game, other_game = game1, game2
 # Play the game
@@ -35,11 +45,17 @@ while not current_game.is_terminal(state):
     # check the move
     assert choice in current_game.actions(state), "The action <{}> is not legal in this state".format(choice)
 
+    if current_player is computer and ponder:
+        print(f"Computer moved {choice} after {computer.last_wait:.3f} sec "
+              f"(ponder hits {computer.ponder_hits}, misses {computer.ponder_misses})")
+
     # apply the move
     state = current_game.result(state, choice)
 
     # swap the players
     current_player, current_game, other_player, other_game = other_player, other_game, current_player, current_game
 
+if ponder:
+    computer.stop_pondering()
 game1.congratulate(state)
 
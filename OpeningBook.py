@@ -0,0 +1,145 @@
+"""
+Opening book: moves from deep offline searches, stored by position key.
+"""
+import argparse
+import mmap
+import struct
+import sys
+
+import AlphaBeta
+import Chess
+
+MAGIC = b"TITANOB1"
+# magic, number of entries
+HEADER = struct.Struct("<8sI")
+# Zobrist key, piece, row, col, depth searched, value
+ENTRY = struct.Struct("<QcBBHd")
+
+
+class OpeningBook:
+    """
+    A read-only opening book, memory-mapped from disk.
+
+    Entries are sorted by transposition key, so a lookup is a binary search
+    over the mapping: opening the book reads nothing but the header, whatever
+    its size.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an opening book")
+
+    def close(self):
+        self._map.close()
+
+    def __len__(self):
+        return self.count
+
+    def __reduce__(self):
+        return (self.__class__, (self.path,))
+
+    def _entry(self, i):
+        return ENTRY.unpack_from(self._map, HEADER.size + i * ENTRY.size)
+
+    def lookup(self, key):
+        """ Return (move, value, depth) stored for a transposition key, or None.
+        """
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = self._entry(mid)
+            if entry[0] < key:
+                lo = mid + 1
+            elif entry[0] > key:
+                hi = mid
+            else:
+                _, piece, row, col, depth, value = entry
+                return (piece.decode(), row, col), value, depth
+        return None
+
+    def move(self, game, state):
+        """ The book move for a state, checked to be legal, or None.
+        """
+        found = self.lookup(game.transposition_key(state))
+        if found is None or found[0] not in game.actions(state):
+            return None
+        return found
+
+
+def write_book(path, entries):
+    """ Write {key: (move, value, depth)} as a book file.
+    """
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(entries)))
+        for key in sorted(entries):
+            (piece, row, col), value, depth = entries[key]
+            f.write(ENTRY.pack(key, piece.encode(), row, col, depth, value))
+
+
+def build(game, depth, plies, width, life=75, rank_depth=2, progress=None):
+    """ Search the opening tree from game.initial_state().
+        Every position reached is searched to the given depth limit for its
+        book move. Positions are expanded through the book move and the
+        width - 1 other moves a rank_depth search rates best, which covers the
+        replies most likely to be played, down to the given number of plies.
+        :return: {key: (move, value, depth)}
+    """
+    # Searchers for the same board, army and weaknesses as game.
+    options = {"titans": len(game.lesser_titans), "weaknesses": game.weaknesses}
+    deep = AlphaBeta.MiniMax(Chess.Game(game.dim, depthlimit=depth, **options))
+    shallow = AlphaBeta.MiniMax(Chess.Game(game.dim, depthlimit=rank_depth, **options))
+    entries = {}
+    frontier = [game.initial_state(starting_life=life)]
+    for ply in range(plies + 1):
+        next_frontier = []
+        for state in frontier:
+            key = game.transposition_key(state)
+            if key in entries or game.is_terminal(state):
+                continue
+            res = deep.choose_move_max(state) if state.maxs_turn else deep.choose_move_min(state)
+            entries[key] = (res.move, res.value, depth)
+            if ply == plies:
+                continue
+            for action in likely_moves(shallow, state, res.move, width):
+                next_frontier.append(game.result(state, action))
+        if progress:
+            progress(ply, len(entries))
+        frontier = next_frontier
+    return entries
+
+
+def likely_moves(searcher, state, book_move, width):
+    """ The book move followed by the width - 1 best other moves of a shallow
+        search, best first.
+    """
+    searcher._begin_search()
+    sign = 1 if state.maxs_turn else -1
+    depth = searcher.game.depth_limit
+    scored = [(sign * searcher.search_move(state, action, -searcher.INF, searcher.INF, depth), i, action)
+              for i, action in enumerate(searcher.game.actions(state)) if action != book_move]
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return [book_move] + [action for _, _, action in scored[:width - 1]]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build an opening book from the initial position.")
+    parser.add_argument("path", help="book file to write")
+    parser.add_argument("--depth", type=int, default=6, help="depth limit of the book searches")
+    parser.add_argument("--plies", type=int, default=4, help="how many plies deep the book goes")
+    parser.add_argument("--width", type=int, default=3, help="moves followed from each position")
+    parser.add_argument("--rank-depth", type=int, default=2, help="depth limit for ranking replies")
+    parser.add_argument("--life", type=int, default=75, help="Titan Hero's starting life")
+    args = parser.parse_args(argv)
+
+    entries = build(Chess.Game(), args.depth, args.plies, args.width, args.life, args.rank_depth,
+                    lambda ply, n: print(f"ply {ply}: {n} positions", file=sys.stderr))
+    write_book(args.path, entries)
+    print(f"{args.path}: {len(entries)} positions")
+
+
+if __name__ == "__main__":
+    main()
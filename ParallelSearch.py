@@ -0,0 +1,154 @@
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from AlphaBeta import MiniMax, SearchTimeout
+from Transposition import TranspositionTable, SharedTranspositionTable, EXACT
+
+# Per-process state of a pool worker, set up by _init_worker.
+_worker = {}
+
+
+def _init_worker(game, shared_bound, table_capacity, table_name, tablebase, selective):
+    searcher = MiniMax(game, TranspositionTable(table_capacity) if table_name is None else None,
+                       tablebase=tablebase, **selective)
+    if table_name is not None:
+        searcher.attach_shared_table(table_name)
+    _worker["searcher"] = searcher
+    _worker["bound"] = shared_bound
+    _worker["search_id"] = None
+
+
+def _search_root_move(state, action, depth, search_id, deadline, node_share):
+    """ Pool task: search one root move and return (value, nodes, finished).
+        The window is opened just below the best root value found so far by
+        any worker, so moves that tie with it still come back exact.
+    """
+    searcher = _worker["searcher"]
+    if search_id != _worker["search_id"]:
+        # With a shared table this leaves the age to the process that owns it.
+        searcher._begin_search()
+        _worker["search_id"] = search_id
+    start_nodes = searcher.nodes_expanded
+
+    best = _worker["bound"].value
+    if state.maxs_turn:
+        alpha, beta = math.nextafter(best, -math.inf), MiniMax.INF
+    else:
+        alpha, beta = -MiniMax.INF, math.nextafter(-best, math.inf)
+    try:
+        value = searcher.search_move(state, action, alpha, beta, depth, deadline, node_share)
+    except SearchTimeout:
+        return None, searcher.nodes_expanded - start_nodes, False
+    return value, searcher.nodes_expanded - start_nodes, True
+
+
+class ParallelMiniMax(MiniMax):
+    """
+    MiniMax that splits the root moves over a pool of worker processes.
+
+    The first root move is searched on its own to establish a bound, then the
+    remaining moves are searched concurrently. Whenever a move improves on the
+    best root value, the new bound is published through shared memory and
+    every task started afterwards searches with it. Each worker keeps its own
+    transposition table for the lifetime of the pool, or with shared_table
+    all workers and this process use one SharedTranspositionTable. An endgame
+    table is reopened by path in each worker.
+
+    The value is identical to MiniMax at the same depth, and a move is only
+    chosen if it beats every move before it in root order, exactly as in the
+    serial search. With selective search turned on, what is pruned depends
+    on the windows the workers get, so values can differ from the serial one.
+    Has the same interface as MiniMax, so ComputerInt can use it directly.
+    """
+    # Workers get their windows from the shared bound instead.
+    ASPIRATION_WINDOW = None
+
+    def __init__(self, game, workers=None, transposition_table=None, worker_table_capacity=1 << 17,
+                 shared_table=False, tablebase=None, reductions=False, futility=False, extensions=False):
+        if shared_table and transposition_table is None:
+            transposition_table = SharedTranspositionTable(worker_table_capacity)
+        selective = {"reductions": reductions, "futility": futility, "extensions": extensions}
+        super().__init__(game, transposition_table, tablebase=tablebase, **selective)
+        self.workers = workers or multiprocessing.cpu_count()
+        table_name = self.transposition_table.name if shared_table else None
+        # Best root value so far, from the point of view of the side to move at the root.
+        self._bound = multiprocessing.Value('d', -self.INF, lock=False)
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                         initargs=(game, self._bound, worker_table_capacity, table_name,
+                                                   tablebase, selective))
+        self._search_id = 0
+
+    def close(self):
+        """ Shut down the worker processes.
+        """
+        self._pool.shutdown(cancel_futures=True)
+        if isinstance(self.transposition_table, SharedTranspositionTable):
+            self.transposition_table.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _root_search(self, state, depth, first_move=None, alpha=-MiniMax.INF, beta=MiniMax.INF, exclude=()):
+        """ Search every root move to the given depth limit on the pool.
+            The root is always searched with a full window.
+            :return: (best value for the side to move, best move, principal
+                     variation); the variation is only the best move
+        """
+        actions = self._root_order(state, first_move, exclude)
+        sign = 1 if state.maxs_turn else -1
+        self._search_id += 1
+        self._bound.value = -self.INF
+        values = [None] * len(actions)
+        timed_out = False
+
+        def submit(i, moves_left):
+            # current_time() is a system-wide monotonic clock, so the deadline
+            # means the same in every worker, however long a task is queued.
+            # The nodes left are shared out evenly between the moves left.
+            node_share = None
+            if self._node_limit is not None:
+                node_share = max(1, (self._node_limit - self.nodes_expanded) // moves_left)
+            return self._pool.submit(_search_root_move, state, actions[i], depth,
+                                     self._search_id, self._deadline, node_share)
+
+        def collect(i, result):
+            nonlocal timed_out
+            value, nodes, finished = result
+            self.nodes_expanded += nodes
+            if not finished:
+                timed_out = True
+                return
+            values[i] = value
+            if sign * value > self._bound.value:
+                self._bound.value = sign * value
+
+        # Young brothers wait: the first move alone sets the initial bound.
+        collect(0, submit(0, 1).result())
+        pending = {submit(i, len(actions) - 1): i for i in range(1, len(actions))} if not timed_out else {}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                collect(pending.pop(future), future.result())
+            if timed_out:
+                for future in pending:
+                    future.cancel()
+                for future in wait(pending)[0]:
+                    if not future.cancelled():
+                        collect(pending[future], future.result())
+                pending = {}
+        if timed_out:
+            raise SearchTimeout()
+
+        # First move in root order with the best value, as the serial search picks.
+        best_index = 0
+        for i, value in enumerate(values):
+            if sign * value > sign * values[best_index]:
+                best_index = i
+        best_value, best_move = sign * values[best_index], actions[best_index]
+        if not exclude:
+            self._store(state, self.game.depth_limit - depth, best_value, EXACT, best_move)
+        return best_value, best_move, [best_move]
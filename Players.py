@@ -1,3 +1,7 @@
+import threading
+
+from AlphaBeta import SearchResult, current_time
+
 class Player:
     """
     Base class for player interface
@@ -45,16 +49,37 @@ class ComputerInt(Player):
     """
     This is a subclass of players and stores a search class object.
     The searcher needs minimax_min and minimax_max methods
+    With an opening book, book moves are played without searching, and so are
+    the quickest wins and slowest losses of the searcher's endgame table.
     """
-    def __init__(self,game,search):
+    def __init__(self,game,search, time_limit=None, node_limit=None, book=None):
         super().__init__(game)
         self.searcher = search
+        self.time_limit = time_limit    # optional per-move budget passed to the searcher
+        self.node_limit = node_limit
+        self.book = book                # optional OpeningBook
+        self.last_result = None         # SearchResult of the most recent move
     
     def _ask_move_search(self, state):
+        if self.book is not None:
+            start = current_time()
+            found = self.book.move(self.game, state)
+            if found is not None:
+                move, value, depth = found
+                self.last_result = SearchResult(value, move, current_time() - start, 0, depth=depth)
+                return move
+        tablebase = getattr(self.searcher, "tablebase", None)
+        if tablebase is not None:
+            start = current_time()
+            move = tablebase.best_move(self.game, state)
+            if move is not None:
+                self.last_result = SearchResult(tablebase.score(state), move, current_time() - start, 0)
+                return move
         if self.game.is_maxs_turn(state):
-            res = self.searcher.choose_move_max(state)
+            res = self.searcher.choose_move_max(state, self.time_limit, self.node_limit)
         else:
-            res = self.searcher.choose_move_min(state) 
+            res = self.searcher.choose_move_min(state, self.time_limit, self.node_limit) 
+        self.last_result = res
         return res.move
     def move(self, state):
         return self._ask_move_search(state)
@@ -68,10 +93,10 @@ class VerboseComp(ComputerInt):
     
     def ask_move(self, state):
         print("Thinking...")
-        res = self._ask_move_search(state)
+        move = self._ask_move_search(state)
         print("...done")
-        res.display()
-        return res.move
+        print(self.last_result)
+        return move
     
 class SilentComp(ComputerInt):
     """
@@ -82,4 +107,90 @@ class SilentComp(ComputerInt):
 
     def ask_move(self, state):
         res = self._ask_move_search(state)
-        return res.move
\ No newline at end of file
+        return res.move
+
+class PonderingComp(ComputerInt):
+    """
+    A computer player that keeps searching while its opponent thinks.
+
+    After choosing a move it guesses the reply, the next move of its principal
+    variation or else the best move its transposition table holds, and starts
+    searching the position after that reply in a background thread. If the
+    reply is played, the player waits for that search instead of starting a
+    new one. Otherwise the background search is stopped and a normal search
+    runs, with the transposition table warmed by the ponder search.
+    """
+    def __init__(self, game, search, time_limit=None, node_limit=None, book=None):
+        super().__init__(game, search, time_limit, node_limit, book)
+        self.ponder_hits = 0
+        self.ponder_misses = 0
+        self.last_wait = None       # seconds spent choosing the most recent move
+        self._thread = None
+        self._ponder_key = None
+        self._ponder_result = None
+
+    def move(self, state):
+        start = current_time()
+        result = self._finish_pondering(state)
+        if result is not None:
+            self.last_result = result
+            move = result.move
+        else:
+            move = self._ask_move_search(state)
+        self.last_wait = current_time() - start
+        self.ponder(self.game.result(state, move))
+        return move
+
+    def ponder(self, state):
+        """ Start searching in the background for the reply to the expected
+            move from state, which it is the opponent's turn to play in.
+        """
+        if self.game.is_terminal(state):
+            return
+        if self.last_result is not None and len(self.last_result.pv) > 1:
+            expected = self.last_result.pv[1]
+        else:
+            entry = self.searcher.transposition_table.probe(self.game.transposition_key(state))
+            expected = entry[4] if entry is not None else None
+        if expected not in self.game.actions(state):
+            return
+        position = self.game.result(state, expected)
+        if self.game.is_terminal(position):
+            return
+        self._ponder_key = self.game.transposition_key(position)
+        self._ponder_result = None
+        self.searcher.stopped = False
+        self._thread = threading.Thread(target=self._ponder_search, args=(position,), daemon=True)
+        self._thread.start()
+
+    def _ponder_search(self, state):
+        if self.game.is_maxs_turn(state):
+            res = self.searcher.choose_move_max(state, self.time_limit, self.node_limit)
+        else:
+            res = self.searcher.choose_move_min(state, self.time_limit, self.node_limit)
+        if not self.searcher.stopped:
+            self._ponder_result = res
+
+    def stop_pondering(self):
+        """ Abandon any background search and wait for it to finish.
+        """
+        if self._thread is not None:
+            self.searcher.stop()
+            self._thread.join()
+            self._thread = None
+            self.searcher.stopped = False
+
+    def _finish_pondering(self, state):
+        """ The result of the background search if it was searching state,
+            after waiting for it to complete; otherwise stop it and return None.
+        """
+        if self._thread is None:
+            return None
+        if self.game.transposition_key(state) != self._ponder_key:
+            self.ponder_misses += 1
+            self.stop_pondering()
+            return None
+        self._thread.join()
+        self._thread = None
+        self.ponder_hits += 1
+        return self._ponder_result
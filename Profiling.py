@@ -0,0 +1,147 @@
+"""
+Opt-in instrumentation for MiniMax searches.
+"""
+import json
+import time
+
+# Game methods timed while a profiled search runs. The search itself plays
+# moves with make_move/unmake_move; result is the copying form used by players.
+# Times are inclusive: eval and make_move both call pantheon_sees_titan.
+TIMED_METHODS = ("actions", "result", "make_move", "unmake_move", "eval",
+                 "in_line_of_sight", "pantheon_sees_titan")
+
+
+class SearchProfile:
+    """
+    Counters and timers for one search, filled in while it runs.
+
+    Nothing here is consulted by an unprofiled search. install() shadows the
+    searcher's node and bookkeeping methods and the game's timed methods with
+    counting wrappers, as instance attributes, and remove() deletes them again,
+    so the search code itself has no profiling branches.
+
+    nodes_by_ply counts every node visited, including leaves, terminal nodes
+    and transposition table hits, by distance from the root (the root itself
+    is not counted). cutoffs_by_index counts beta cutoffs by the position of
+    the refuting move in the ordered move list, so index 0 means the first
+    move searched was good enough.
+    """
+    def __init__(self):
+        self.nodes_by_ply = {}
+        self.leaves = 0
+        self.terminals = 0
+        self.cutoffs = 0
+        self.cutoffs_by_index = {}
+        self.tt = {}
+        self.calls = {name: 0 for name in TIMED_METHODS}
+        self.times = {name: 0.0 for name in TIMED_METHODS}
+        self.elapsed = 0.0
+        self._ordered = {}      # ply -> move list of the node being searched there
+        self._searcher = None
+        self._tt_before = None
+
+    def install(self, searcher):
+        """ Start recording the searches run by searcher.
+        """
+        self._searcher = searcher
+        self._tt_before = self._tt_counters(searcher.transposition_table)
+        self._started = time.perf_counter()
+        game = searcher.game
+        for name in TIMED_METHODS:
+            setattr(game, name, self._timed(name, getattr(game, name)))
+        searcher._negamax = self._node(searcher._negamax)
+        searcher._order_moves = self._ordering(searcher._order_moves)
+        searcher._record_cutoff = self._cutoff(searcher._record_cutoff)
+
+    def remove(self):
+        """ Stop recording and restore the searcher and game methods.
+        """
+        searcher = self._searcher
+        for name in TIMED_METHODS:
+            searcher.game.__dict__.pop(name, None)
+        for name in ("_negamax", "_order_moves", "_record_cutoff"):
+            searcher.__dict__.pop(name, None)
+        after = self._tt_counters(searcher.transposition_table)
+        self.tt = {name: after[name] - self._tt_before[name] for name in after}
+        self.elapsed = time.perf_counter() - self._started
+        self._ordered = {}
+        self._searcher = None
+
+    @staticmethod
+    def _tt_counters(table):
+        return {name: getattr(table, name) for name in ("probes", "hits", "stores", "overwrites")}
+
+    def _timed(self, name, method):
+        calls, times = self.calls, self.times
+        clock = time.perf_counter
+
+        def timed(*args):
+            start = clock()
+            try:
+                return method(*args)
+            finally:
+                times[name] += clock() - start
+                calls[name] += 1
+        return timed
+
+    def _node(self, search):
+        searcher = self._searcher
+        game = searcher.game
+        nodes = self.nodes_by_ply
+
+        def node(state, alpha, beta, depth, ply, pv):
+            nodes[ply] = nodes.get(ply, 0) + 1
+            if game.is_terminal(state):
+                self.terminals += 1
+            elif game.cutoff_test(state, depth):
+                self.leaves += 1
+            return search(state, alpha, beta, depth, ply, pv)
+        return node
+
+    def _ordering(self, order_moves):
+        ordered = self._ordered
+
+        def order(state, actions, ply, tt_move):
+            moves = order_moves(state, actions, ply, tt_move)
+            ordered[ply] = moves
+            return moves
+        return order
+
+    def _cutoff(self, record_cutoff):
+        ordered = self._ordered
+        by_index = self.cutoffs_by_index
+
+        def cutoff(state, action, depth, ply):
+            # The latest move list at this ply is the one of the node that cut off.
+            index = ordered[ply].index(action)
+            by_index[index] = by_index.get(index, 0) + 1
+            self.cutoffs += 1
+            return record_cutoff(state, action, depth, ply)
+        return cutoff
+
+    def as_dict(self):
+        return {"elapsed": self.elapsed,
+                "nodes": sum(self.nodes_by_ply.values()),
+                "nodes_by_ply": dict(sorted(self.nodes_by_ply.items())),
+                "leaves": self.leaves,
+                "terminals": self.terminals,
+                "tt": self.tt,
+                "cutoffs": self.cutoffs,
+                "cutoffs_by_index": dict(sorted(self.cutoffs_by_index.items())),
+                "calls": self.calls,
+                "times": self.times}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.as_dict(), **kwargs)
+
+    def __str__(self):
+        first = self.cutoffs_by_index.get(0, 0)
+        lines = [f"Nodes by ply: {dict(sorted(self.nodes_by_ply.items()))}",
+                 f"Leaves: {self.leaves}, terminal: {self.terminals}",
+                 f"TT: {self.tt}",
+                 f"Cutoffs: {self.cutoffs} ({first / self.cutoffs:.0%} on the first move)"
+                 if self.cutoffs else "Cutoffs: 0"]
+        for name in TIMED_METHODS:
+            if self.calls[name]:
+                lines.append(f"{name:20} {self.calls[name]:9} calls {self.times[name]:8.4f} sec")
+        return "\n".join(lines)
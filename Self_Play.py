@@ -0,0 +1,156 @@
+import argparse
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import Players
+import AlphaBeta as Computer
+import Chess as Game
+from GameRecord import RecordWriter
+from OpeningBook import OpeningBook
+
+# Selective search features of MiniMax that can be switched on per side.
+SELECTIVE = ("reductions", "futility", "extensions")
+
+
+def play_game(game_id, seed, life, titan, legion, book_path=None):
+    """
+    Play one computer-vs-computer game and return its record.
+    titan and legion are dicts with the side's depth, optional time/node budget
+    and the selective search features it uses.
+    With book_path, both sides play from that opening book while it has moves.
+    Both sides shuffle enemy moves with the game's seed, so different seeds give
+    different games and the same seed replays the same game.
+    The record includes the moves played, for writing the game out with
+    GameRecord; run() takes them out before the record is saved as JSON.
+    """
+    book = OpeningBook(book_path) if book_path else None
+    sides = {}
+    for name, conf in (("titan", titan), ("legion", legion)):
+        game = Game.Game(depthlimit=conf["depth"], shuffle=seed is not None, seed=seed)
+        searcher = Computer.MiniMax(game, **{f: conf.get(f, False) for f in SELECTIVE})
+        sides[name] = (game, Players.ComputerInt(game, searcher, conf.get("time"), conf.get("nodes"), book))
+    state = sides["titan"][0].initial_state(starting_life=life)
+
+    stats = {name: {"depth": conf["depth"], "time_limit": conf.get("time"), "node_limit": conf.get("nodes"),
+                    "selective": [f for f in SELECTIVE if conf.get(f)],
+                    "moves": 0, "nodes": 0, "time": 0.0, "max_time": 0.0, "depth_total": 0}
+             for name, conf in (("titan", titan), ("legion", legion))}
+    moves = []
+    while not state.cachedTerminal:
+        name = "titan" if state.maxs_turn else "legion"
+        game, player = sides[name]
+        choice = player.move(state)
+        res = player.last_result
+        side = stats[name]
+        side["moves"] += 1
+        side["nodes"] += res.nodes
+        side["time"] += res.elapsed_time
+        side["max_time"] = max(side["max_time"], res.elapsed_time)
+        side["depth_total"] += res.depth or 0
+        moves.append(choice)
+        state = game.result(state, choice)
+
+    return {"id": game_id, "seed": seed, "life0": life,
+            "winner": "T" if state.cachedOutcome else "L",
+            "plies": state.moves_made, "life": state.life, "emblems": len(state.emblems),
+            "titan": stats["titan"], "legion": stats["legion"], "moves": moves}
+
+
+def aggregate(records):
+    """
+    Summarize game records: win rate, game length, final life and per-move search cost.
+    """
+    records = list(records)
+    n = len(records)
+    if not n:
+        return {"games": 0}
+    summary = {"games": n,
+               "titan_win_rate": sum(r["winner"] == "T" for r in records) / n,
+               "mean_plies": sum(r["plies"] for r in records) / n,
+               "mean_final_life": sum(r["life"] for r in records) / n}
+    for side in ("titan", "legion"):
+        moves = sum(r[side]["moves"] for r in records) or 1
+        summary[side] = {"nodes_per_move": sum(r[side]["nodes"] for r in records) / moves,
+                         "time_per_move": sum(r[side]["time"] for r in records) / moves,
+                         "max_time_per_move": max(r[side]["max_time"] for r in records),
+                         "depth_per_move": sum(r[side].get("depth_total", 0) for r in records) / moves}
+    return summary
+
+
+def read_records(path):
+    """
+    Stream game records back from a results file.
+    """
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def run(games, workers, out_path, seed, life, titan, legion, book_path=None, record_path=None):
+    """
+    Play games across a process pool, appending each record to out_path as a
+    JSON line as soon as its game finishes, and with record_path the game
+    itself to that GameRecord file. Returns the aggregate summary.
+    """
+    records = []
+    start = Game.Game().initial_state(starting_life=life)
+    game_file = RecordWriter(record_path) if record_path else None
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(out_path, "a") as out:
+        futures = [pool.submit(play_game, i, None if seed is None else seed + i, life, titan, legion,
+                               book_path)
+                   for i in range(games)]
+        for done, future in enumerate(as_completed(futures), 1):
+            record = future.result()
+            moves = record.pop("moves")
+            if game_file:
+                game_file.write_game(start, moves, 1 if record["winner"] == "T" else -1)
+            records.append(record)
+            out.write(json.dumps(record, separators=(",", ":")) + "\n")
+            out.flush()
+            if done % max(1, games // 20) == 0:
+                print(f"{done}/{games} games finished", file=sys.stderr)
+    if game_file:
+        game_file.close()
+    return aggregate(records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless computer-vs-computer self-play.")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all CPUs)")
+    parser.add_argument("--out", default="self_play.jsonl", help="results file, appended to")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="base seed; game i uses seed+i to shuffle enemy moves "
+                             "(the search is deterministic, so unshuffled games are all the same)")
+    parser.add_argument("--life", type=int, default=75, help="Titan Hero's starting life")
+    for side in ("titan", "legion"):
+        parser.add_argument(f"--{side}-depth", type=int, default=2)
+        parser.add_argument(f"--{side}-time", type=float, default=None,
+                            help="seconds per move, searched by iterative deepening")
+        parser.add_argument(f"--{side}-nodes", type=int, default=None, help="nodes per move")
+        for feature in SELECTIVE:
+            parser.add_argument(f"--{side}-{feature}", action="store_true",
+                                help=f"turn on {feature} in the side's search")
+    parser.add_argument("--book", help="opening book file, built with OpeningBook.py")
+    parser.add_argument("--record", metavar="FILE", help="also append the games to this GameRecord file")
+    parser.add_argument("--summarize", metavar="FILE",
+                        help="only print the summary of an existing results file")
+    args = parser.parse_args(argv)
+
+    if args.summarize:
+        summary = aggregate(read_records(args.summarize))
+    else:
+        sides = {side: {"depth": getattr(args, f"{side}_depth"),
+                        "time": getattr(args, f"{side}_time"),
+                        "nodes": getattr(args, f"{side}_nodes"),
+                        **{feature: getattr(args, f"{side}_{feature}") for feature in SELECTIVE}}
+                 for side in ("titan", "legion")}
+        summary = run(args.games, args.workers, args.out, args.seed, args.life,
+                      sides["titan"], sides["legion"], args.book, args.record)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Endgame tablebase for Titan Hero against a lone Pantheon.
+
+Once every lesser titan is defeated a position is fully described by the
+Titan Hero's square, the Pantheon's square, life and the side to move, so
+every such position up to a life limit can be solved exactly and stored.
+"""
+import argparse
+import mmap
+import struct
+import sys
+from array import array
+
+import Chess
+
+MAGIC = b"TITANTB1"
+# magic, board size, highest life covered
+HEADER = struct.Struct("<8sII")
+
+
+def preference(value):
+    """ Sort key for table values from the Titan Hero's point of view: any win
+        beats any loss, quicker wins and slower losses are better. The Legion
+        takes the minimum.
+    """
+    return (1, -value) if value > 0 else (0, -value)
+
+
+def better(value, best, maxs_turn):
+    """ True if the side to move prefers value to best.
+    """
+    if best is None:
+        return True
+    return preference(value) > preference(best) if maxs_turn else preference(value) < preference(best)
+
+
+def child_value(child):
+    """ A child's table value seen one ply further up.
+    """
+    return child + 1 if child > 0 else child - 1
+
+
+class EndgameTable:
+    """
+    A solved Titan Hero vs Pantheon ending, memory-mapped from disk.
+
+    The file is the header followed by one signed 16-bit value per position
+    in native byte order,
+    indexed by life, side to move, Titan square and Pantheon square:
+        n > 0   the Titan Hero wins in n plies
+        n < 0   the Titan Hero loses in -n plies
+        0       not a position (both pieces on one square)
+    Positions with life above max_life are not covered and probe as None.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            self._map.close()
+            raise ValueError(f"{path} is not an endgame table")
+        magic, self.dim, self.max_life = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not an endgame table")
+        self.squares = self.dim * self.dim
+        self._values = memoryview(self._map)[HEADER.size:].cast("h")
+        self.hits = 0
+
+    @classmethod
+    def load(cls, path):
+        return cls(path)
+
+    def close(self):
+        self._values.release()
+        self._map.close()
+
+    def __reduce__(self):
+        # Reopen by path in other processes instead of pickling the mapping.
+        return (self.__class__.load, (self.path,))
+
+    def index(self, t_square, p_square, life, maxs_turn):
+        return (((life - 1) * 2 + (0 if maxs_turn else 1)) * self.squares + t_square) * self.squares + p_square
+
+    def probe(self, state):
+        """ Return the stored value of a Titan Hero vs Pantheon state, or None
+            if the state has lesser titans left, is on another board size or
+            lies outside the table.
+        """
+        boards = state.boards
+        if state.lesser_occ or len(boards) != 2 or not 0 < state.life <= self.max_life or state.dim != self.dim:
+            return None
+        self.hits += 1
+        return self._values[self.index(boards['T'].bit_length() - 1, boards['P'].bit_length() - 1,
+                                       state.life, state.maxs_turn)]
+
+    def score(self, state, win=100):
+        """ The exact minimax value of a covered state on the scale of
+            Game.utility, less one per ply to the end: win - n for a win in n
+            plies and n - win for a loss in n, so a search prefers quicker
+            wins and slower losses. None if the state is not covered.
+        """
+        value = self.probe(state)
+        if not value:
+            return None
+        return win - value if value > 0 else -win - value
+
+    def best_move(self, game, state):
+        """ The quickest win, or the slowest loss, from a covered state; None
+            if the state is not covered.
+        """
+        if self.probe(state) is None:
+            return None
+        best, best_value = None, None
+        for action in game.actions(state):
+            undo = game.make_move(state, action)
+            if state.cachedTerminal:
+                value = 1 if state.cachedOutcome else -1
+            else:
+                value = child_value(self.probe(state))
+            game.unmake_move(state, undo)
+            if better(value, best_value, state.maxs_turn):
+                best, best_value = action, value
+        return best
+
+
+def successors(game, t_square, p_square, maxs_turn):
+    """ The moves from a Titan Hero vs Pantheon position, found by playing them
+        with the game's own rules at a life high enough that none is fatal.
+        :return: list of (t_square, p_square, life lost), with p_square None
+                 for the capture of the Pantheon
+    """
+    dim = game.dim
+    state = game.state_from_positions({'T': divmod(t_square, dim), 'P': divmod(p_square, dim)},
+                                      life=1 << 20, emblems=game.lesser_titans, maxs_turn=maxs_turn)
+    moves = []
+    for action in game.actions(state):
+        undo = game.make_move(state, action)
+        if state.cachedTerminal:
+            moves.append((None, None, 0))
+        else:
+            moves.append((state.boards['T'].bit_length() - 1, state.boards['P'].bit_length() - 1,
+                          (1 << 20) - state.life))
+        game.unmake_move(state, undo)
+    return moves
+
+
+def generate(game, max_life, path, progress=None):
+    """ Solve every Titan Hero vs Pantheon position with life 1..max_life and
+        write the table to path.
+
+        The Titan Hero loses one life per move and the Pantheon's smite takes
+        three, so every move keeps or lowers life and a Titan move always
+        lowers it. Solving life levels upwards, the Titan positions at life L
+        only lead to Pantheon positions at L - 1, and the Pantheon positions at
+        L only to Titan positions at L or L - 3, all of which are already
+        solved: the retrograde order is simply increasing life.
+    """
+    squares = game.dim * game.dim
+    pairs = [(t, p) for t in range(squares) for p in range(squares) if t != p]
+    moves = {(t, p, side): successors(game, t, p, side) for t, p in pairs for side in (True, False)}
+    layer = 2 * squares * squares
+    values = array("h", bytes(2 * layer * max_life))
+
+    def index(t, p, life, maxs_turn):
+        return (((life - 1) * 2 + (0 if maxs_turn else 1)) * squares + t) * squares + p
+
+    for life in range(1, max_life + 1):
+        for maxs_turn in (True, False):
+            for t, p in pairs:
+                best = None
+                for nt, np_, lost in moves[(t, p, maxs_turn)]:
+                    if np_ is None:
+                        value = 1                   # the Pantheon is captured
+                    elif life - lost <= 0:
+                        value = -1                  # the Titan Hero's life runs out
+                    else:
+                        value = child_value(values[index(nt, np_, life - lost, not maxs_turn)])
+                    if better(value, best, maxs_turn):
+                        best = value
+                values[index(t, p, life, maxs_turn)] = best
+        if progress:
+            progress(life)
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, game.dim, max_life))
+        values.tofile(f)
+    return EndgameTable(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the Titan Hero vs Pantheon endgame table.")
+    parser.add_argument("path", help="file to write")
+    parser.add_argument("--max-life", type=int, default=75, help="highest life to solve")
+    parser.add_argument("--dim", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    table = generate(Chess.Game(dim=args.dim), args.max_life, args.path,
+                     lambda life: print(f"life {life} solved", file=sys.stderr) if life % 10 == 0 else None)
+    wins = sum(1 for v in table._values if v > 0)
+    print(f"{args.path}: {len(table._values)} entries, {wins} Titan Hero wins")
+    table.close()
+
+
+if __name__ == "__main__":
+    main()
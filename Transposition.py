@@ -0,0 +1,380 @@
+"""
+Fixed-size transposition table for the game tree search.
+"""
+
+# Bound types stored with each entry.
+EXACT = 0   # the value is the minimax value of the position
+LOWER = 1   # the search failed high: the true value is at least this
+UPPER = 2   # the search failed low: the true value is at most this
+
+
+class TranspositionTable:
+    """
+    A transposition table with a fixed number of slots, indexed by Zobrist key.
+
+    Each slot holds one entry, a tuple (key, depth, value, flag, move, age):
+    depth is the number of plies searched below the position, flag is one of
+    EXACT/LOWER/UPPER, move is the best move found and age is the search that
+    stored it. A slot is replaced when it is empty, holds the same position,
+    was written by an older search, or holds a result no deeper than the new one.
+    The table is meant to live across consecutive searches of a game; call
+    new_search() before each one so stale entries age out.
+    """
+    # Rough CPython footprint of one entry (tuple, key, value, move), for sizing.
+    ENTRY_BYTES = 220
+
+    def __init__(self, capacity=1 << 17):
+        self.capacity = capacity
+        self.slots = [None] * capacity
+        self.age = 0
+        self.filled = 0
+        self.reset_stats()
+
+    @classmethod
+    def for_memory(cls, megabytes):
+        """ Build a table sized to fit roughly the given memory budget.
+        """
+        return cls(max(1, int(megabytes * 2**20) // cls.ENTRY_BYTES))
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def new_search(self):
+        """ Mark the start of a new search; older entries become replaceable.
+        """
+        self.age += 1
+
+    def clear(self):
+        self.slots = [None] * self.capacity
+        self.filled = 0
+
+    def probe(self, key, draft=None):
+        """ Return the entry stored for key, or None.
+            :param draft: plies the caller will search below the position; an
+                          entry of any depth is returned regardless
+        """
+        self.probes += 1
+        entry = self.slots[key % self.capacity]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, value, flag, move):
+        """ Store a search result, subject to the replacement policy.
+        """
+        index = key % self.capacity
+        old = self.slots[index]
+        if old is None:
+            self.filled += 1
+        elif old[0] != key:
+            if old[5] == self.age and old[1] > depth:
+                return
+            self.overwrites += 1
+        self.slots[index] = (key, depth, value, flag, move, self.age)
+        self.stores += 1
+
+    def stats(self):
+        """ Counters for sizing the table against a memory budget.
+        """
+        return {"capacity": self.capacity, "filled": self.filled,
+                "probes": self.probes, "hits": self.hits, "misses": self.misses,
+                "stores": self.stores, "overwrites": self.overwrites,
+                "approx_bytes": self.filled * self.ENTRY_BYTES + self.capacity * 8}
+
+    def __len__(self):
+        return self.filled
+
+
+class SharedTranspositionTable:
+    """
+    A transposition table stored in a multiprocessing.shared_memory block, so
+    several processes can probe and fill the same table without pickling it.
+
+    The block starts with a header of HEADER_WORDS 64-bit words (magic,
+    capacity, age) followed by capacity entries of three 64-bit words:
+        check  key ^ value bits ^ data
+        value  the stored value as a double
+        data   depth (16 bits) | flag (2) | age (8) | move: has-move (1),
+               piece code (8), row (8), col (8) | valid (1)
+    Writes take no lock. A reader recomputes the key from the check word, so
+    an entry torn by a concurrent write reads as a miss instead of a wrong
+    result. Moves are (piece, row, col) with a single-character piece name.
+    Create the table in one process and attach() to it by name in the others.
+    """
+    MAGIC = 0x5454414C42 # "TTABL"
+    HEADER_WORDS = 8
+    ENTRY_WORDS = 3
+    VALID = 1 << 51
+
+    def __init__(self, capacity=1 << 17, name=None, _shm=None):
+        from multiprocessing import shared_memory
+        if _shm is None:
+            size = 8 * (self.HEADER_WORDS + self.ENTRY_WORDS * capacity)
+            _shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self.owner = True
+        else:
+            self.owner = False
+        self.shm = _shm
+        self.name = _shm.name
+        self._words = _shm.buf.cast('Q')
+        self._doubles = _shm.buf.cast('d')
+        if self.owner:
+            self._words[0] = self.MAGIC
+            self._words[1] = capacity
+            self._words[2] = 0
+        elif self._words[0] != self.MAGIC:
+            raise ValueError(f"{self.name} is not a shared transposition table")
+        self.capacity = self._words[1]
+        self.reset_stats()
+
+    @classmethod
+    def attach(cls, name):
+        """ Attach to a table created by another process.
+        """
+        from multiprocessing import shared_memory
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13 attaching registers the block with the resource
+            # tracker. Processes started from the creator share its tracker, so
+            # this is harmless for pool workers; an unrelated process would
+            # unlink the block when it exits.
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(_shm=shm)
+
+    @classmethod
+    def for_memory(cls, megabytes, name=None):
+        """ Build a table sized to the given memory budget.
+        """
+        return cls(max(1, int(megabytes * 2**20) // (8 * cls.ENTRY_WORDS)), name)
+
+    def close(self):
+        """ Detach from the block, and remove it if this process created it.
+        """
+        self._words.release()
+        self._doubles.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    @property
+    def age(self):
+        return self._words[2]
+
+    def new_search(self):
+        """ Advance the age, in the creating process only. Attached processes
+            search on behalf of the creator, so a worker starting its share of
+            a search leaves the age alone; otherwise the age would move on once
+            per worker and entries stored moments earlier would look stale.
+        """
+        if self.owner:
+            self._words[2] = (self._words[2] + 1) & 0xFF
+
+    def clear(self):
+        self.shm.buf[8 * self.HEADER_WORDS:] = bytes(len(self.shm.buf) - 8 * self.HEADER_WORDS)
+
+    def _read(self, index):
+        """ Return the (key, value, data) of a slot; key is 0 for an empty slot.
+        """
+        base = self.HEADER_WORDS + self.ENTRY_WORDS * index
+        words = self._words
+        check, value_bits, data = words[base], words[base + 1], words[base + 2]
+        if not data:
+            return 0, 0.0, 0
+        return check ^ value_bits ^ data, self._doubles[base + 1], data
+
+    def probe(self, key, draft=None):
+        """ Return the entry stored for key as (key, depth, value, flag, move, age), or None.
+            The draft is ignored, as in TranspositionTable.probe.
+        """
+        self.probes += 1
+        stored_key, value, data = self._read(key % self.capacity)
+        if not data or stored_key != key:
+            self.misses += 1
+            return None
+        self.hits += 1
+        move = None
+        if data >> 26 & 1:
+            move = (chr(data >> 27 & 0xFF), data >> 35 & 0xFF, data >> 43 & 0xFF)
+        return (key, data & 0xFFFF, value, data >> 16 & 0x3, move, data >> 18 & 0xFF)
+
+    def store(self, key, depth, value, flag, move):
+        """ Store a search result, with the same replacement policy as
+            TranspositionTable.
+        """
+        index = key % self.capacity
+        stored_key, _, old = self._read(index)
+        age = self._words[2]
+        if old and stored_key != key:
+            if old >> 18 & 0xFF == age and old & 0xFFFF > depth:
+                return
+            self.overwrites += 1
+        data = self.VALID | (depth & 0xFFFF) | flag << 16 | age << 18
+        if move is not None:
+            piece, row, col = move
+            data |= 1 << 26 | ord(piece) << 27 | row << 35 | col << 43
+        base = self.HEADER_WORDS + self.ENTRY_WORDS * index
+        self._doubles[base + 1] = value
+        value_bits = self._words[base + 1]
+        self._words[base + 2] = data
+        self._words[base] = key ^ value_bits ^ data
+        self.stores += 1
+
+    def stats(self):
+        return {"capacity": self.capacity, "name": self.name,
+                "probes": self.probes, "hits": self.hits, "misses": self.misses,
+                "stores": self.stores, "overwrites": self.overwrites,
+                "bytes": len(self.shm.buf)}
+
+
+class PersistentTranspositionTable(TranspositionTable):
+    """
+    A TranspositionTable backed by an SQLite file, so results survive from
+    one run to the next and repeated analysis of the same positions mostly
+    comes from disk instead of being searched again.
+
+    The search works on the in-memory table as usual. A probe that misses
+    there, or finds an entry too shallow for the draft it asks for, looks the
+    key up in the file, deepest result first, and copies the entry into
+    memory. With exact_depth only a row of exactly the draft asked for is
+    used, so a cached result stands in for the search it replaces rather
+    than a deeper one, and results barely depend on what is in the file.
+
+    Results with at least min_depth plies below them are queued as they are
+    stored and written in one transaction by flush(), which runs at the start
+    of every search and on close(). Results closer to the leaves are cheaper
+    to search again than to keep.
+
+    Rows are keyed by Zobrist key and depth and hold the value, bound and
+    best move. Every flush advances a clock; rows written or read during a
+    search get its time, and when the file holds more than max_entries rows
+    the least recently used are deleted. Values are only valid for the
+    evaluation and search settings that produced them: a file opened with
+    a different tag is emptied first.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            key INTEGER NOT NULL, depth INTEGER NOT NULL, value REAL NOT NULL, flag INTEGER NOT NULL,
+            piece TEXT, row INTEGER, col INTEGER, used INTEGER NOT NULL,
+            PRIMARY KEY (key, depth)) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS entries_used ON entries (used);
+        CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+    """
+
+    def __init__(self, path, capacity=1 << 17, max_entries=1 << 20, min_depth=2, tag="", exact_depth=False):
+        import sqlite3
+        super().__init__(capacity)
+        self.path = path
+        self.exact_depth = exact_depth
+        self.max_entries = max_entries
+        self.min_depth = min_depth
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+        meta = dict(self._db.execute("SELECT name, value FROM meta"))
+        with self._db:
+            if meta.get("tag", tag) != tag:
+                self._db.execute("DELETE FROM entries")
+                meta["clock"] = 0
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('tag', ?)", (tag,))
+        self.clock = int(meta.get("clock", 0))
+        self._pending = {}      # (key, depth) -> (value, flag, move) waiting to be written
+        self._used = set()      # (key, depth) of rows read since the last flush
+
+    @staticmethod
+    def _signed(key):
+        # SQLite integers are signed 64-bit.
+        return key - (1 << 64) if key >= 1 << 63 else key
+
+    def reset_stats(self):
+        super().reset_stats()
+        self.disk_hits = 0
+        self.written = 0
+        self.evicted = 0
+
+    def new_search(self):
+        self.flush()
+        super().new_search()
+
+    def probe(self, key, draft=None):
+        entry = super().probe(key)
+        if entry is not None and (draft is None or entry[1] >= draft):
+            return entry
+        # Missing from memory, or too shallow to settle the position: try the file.
+        if self.exact_depth and draft is not None:
+            row = self._db.execute("SELECT depth, value, flag, piece, row, col FROM entries "
+                                   "WHERE key = ? AND depth = ?", (self._signed(key), draft)).fetchone()
+        else:
+            row = self._db.execute("SELECT depth, value, flag, piece, row, col FROM entries WHERE key = ? "
+                                   "ORDER BY depth DESC LIMIT 1", (self._signed(key),)).fetchone()
+        if row is None or entry is not None and row[0] <= entry[1]:
+            return entry
+        depth, value, flag, piece, r, c = row
+        if entry is None:
+            self.misses -= 1
+            self.hits += 1
+        self.disk_hits += 1
+        self._used.add((key, depth))
+        move = None if piece is None else (piece, r, c)
+        super().store(key, depth, value, flag, move)
+        self.stores -= 1
+        return key, depth, value, flag, move, self.age
+
+    def store(self, key, depth, value, flag, move):
+        super().store(key, depth, value, flag, move)
+        if depth >= self.min_depth:
+            self._pending[(key, depth)] = (value, flag, move)
+
+    def flush(self):
+        """ Write the queued results, mark the rows read as used and evict
+            the least recently used rows beyond max_entries.
+        """
+        if not self._pending and not self._used:
+            return
+        self.clock += 1
+        rows = [(self._signed(key), depth, value, flag) + (move or (None, None, None)) + (self.clock,)
+                for (key, depth), (value, flag, move) in self._pending.items()]
+        used = [(self.clock, self._signed(key), depth) for key, depth in self._used]
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._db.executemany("UPDATE entries SET used = ? WHERE key = ? AND depth = ?", used)
+            excess = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._db.execute("DELETE FROM entries WHERE (key, depth) IN "
+                                 "(SELECT key, depth FROM entries ORDER BY used LIMIT ?)", (excess,))
+                self.evicted += excess
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('clock', ?)", (str(self.clock),))
+        self.written += len(rows)
+        self._pending = {}
+        self._used = set()
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({"path": self.path, "disk_hits": self.disk_hits, "written": self.written,
+                      "evicted": self.evicted,
+                      "entries": self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]})
+        return stats
@@ -0,0 +1,98 @@
+"""
+Checks that the terms make_move and unmake_move keep on a state (Zobrist key,
+occupancy masks, square index and evaluation terms) always match a
+from-scratch computation, over random playouts.
+
+Run with: python -m unittest test_Chess
+"""
+import random
+import unittest
+
+import Chess
+
+SLOTS = ('maxs_turn', 'cachedTerminal', 'cachedOutcome', 'moves_made', 'life', 'boards', 'lesser_occ',
+         'enemy_occ', 'all_occ', 'enemy_at', 'emblems', 'zobrist', 'lesser_count', 'distance_sum',
+         'pantheon_displacement')
+
+
+def snapshot(state):
+    return {name: getattr(state, name).copy() if isinstance(getattr(state, name), (dict, set))
+            else getattr(state, name) for name in SLOTS}
+
+
+def scratch_eval(game, state):
+    """ Game.eval worked out from the piece positions alone, as it was before
+        the evaluation terms were kept on the state.
+    """
+    positions = state.positions
+    hero = positions['T']
+    lesser = [positions[p] for p in game.lesser_titans if p in positions]
+    total_distance = sum(abs(hero[0] - r) + abs(hero[1] - c) for r, c in lesser)
+    avg_distance = (total_distance / len(lesser)) if lesser else 0
+
+    score = 1.0 * state.life
+    score -= 20.0 * (len(lesser) + ('P' in positions))
+    score -= 1.5 * avg_distance
+    score += 5.0 * len(state.emblems)
+    if 'P' in positions:
+        pantheon = positions['P']
+        if not lesser:
+            score += 50.0 / (abs(hero[0] - pantheon[0]) + abs(hero[1] - pantheon[1]) + 1)
+        if game.in_line_of_sight(pantheon, hero, state):
+            score -= 15.0
+        ideal = game.ideal_pantheon
+        score -= 40.0 * (abs(pantheon[0] - ideal[0]) + abs(pantheon[1] - ideal[1]))
+    return score
+
+
+class IncrementalStateTest(unittest.TestCase):
+    PLAYOUTS = 40
+
+    def check_state(self, game, state):
+        fresh = state.myclone()
+        game.sync_state(fresh)
+        self.assertEqual(state.zobrist, game.zobrist_hash(state))
+        for name in ('zobrist', 'lesser_count', 'distance_sum', 'pantheon_displacement',
+                     'lesser_occ', 'enemy_occ', 'all_occ', 'enemy_at'):
+            self.assertEqual(getattr(state, name), getattr(fresh, name), name)
+        if not state.cachedTerminal:
+            self.assertEqual(game.eval(state), scratch_eval(game, state))
+
+    def playouts(self, game, seed):
+        rng = random.Random(seed)
+        for _ in range(self.PLAYOUTS):
+            state = game.initial_state(starting_life=rng.randrange(20, 100))
+            history = []
+            while not state.cachedTerminal:
+                actions = game.actions(state)
+                if not actions:
+                    break
+                before = snapshot(state)
+                action = rng.choice(actions)
+                undo = game.make_move(state, action)
+                self.check_state(game, state)
+                # Take the move back now and then to check unmake restores everything.
+                if rng.random() < 0.3:
+                    game.unmake_move(state, undo)
+                    self.assertEqual(snapshot(state), before)
+                    self.check_state(game, state)
+                    undo = game.make_move(state, action)
+                history.append((undo, before))
+            # Unwind the whole game back to the start.
+            for undo, before in reversed(history):
+                game.unmake_move(state, undo)
+                self.assertEqual(snapshot(state), before)
+
+    def test_standard_game(self):
+        self.playouts(Chess.Game(), seed=1)
+
+    def test_shuffled_game(self):
+        self.playouts(Chess.Game(shuffle=True, seed=7), seed=2)
+
+    def test_other_boards(self):
+        self.playouts(Chess.Game(6, titans=4), seed=3)
+        self.playouts(Chess.Game(10, titans=12), seed=4)
+
+
+if __name__ == "__main__":
+    unittest.main()